@@ -3,23 +3,33 @@ import memory
 import operations
 import common
 import flow.emulator
+import flow.blocks
+from common.instructions import indexed, CALL
 
 
 def detect_flow(instructions, start_address):
     """Creates a flat flow graph."""
-    flow_emulator = flow.emulator.SimpleEmulator(instructions, start_address)
+    flow_emulator = flow.emulator.WorklistSimpleEmulator(instructions, start_address)
     return flow_emulator.flow
 
 
+def find_blocks(instructions):
+    """Finds basic blocks of the whole program at once. Flat flow graphs of functions are taken from the result."""
+    return flow.blocks.BlockTable(instructions)
+
+
 def find_function_addresses(parsed_code):
     '''returns ints'''
+    parsed_code = indexed(parsed_code)
     function_addrs = []
 
-    for instruction in parsed_code:
-        if instruction.mnemonic == "entry":
-            function_addrs.append(instruction.address)
-        elif instruction.calls_function():
-            function_addrs.append(instruction.function)
+    for i in xrange(len(parsed_code)):
+        if parsed_code.get_mnemonic(i) == "entry":
+            function_addrs.append(parsed_code[i].address)
+            continue
+        kind, target = parsed_code.get_flow(i)
+        if kind == CALL:
+            function_addrs.append(target)
     return set(function_addrs)
 
 
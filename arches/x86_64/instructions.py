@@ -128,6 +128,7 @@ class Repeater(BaseInstruction):
             raise ValueError("Instruction prefixed with {0} can't have {1} as mnemonic.".format(repeater, mnemonic))
         operands = instruction[1:]
         BaseInstruction.__init__(self, arch, address, opcode, repeater + ' ' + mnemonic, operands)
+        self.repeater = repeater
         
         insn_map = {}
         for insn_name, insn_class in instruction_map.items():
@@ -145,6 +146,9 @@ class Repeater(BaseInstruction):
     def calls_function(self):
         return self.instruction.calls_function()
 
+    def get_source(self):
+        return self.repeater, [self.instruction.mnemonic] + self.instruction.operands
+
 
 instruction_map = {'ret': RetInstruction,
                    'retq': RetInstruction,
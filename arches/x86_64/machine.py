@@ -1,27 +1,21 @@
 import values
+import operations
 import memory
 
 
-class Registers:
-    REGISTERS = ['$a' + str(num) for num in range(16)]
-    def __init__(self):
-        self.gp = [values.UnknownValue(reg_name) for reg_name in self.REGISTERS]
-    
-    def get(self, name):
-        return self.gp[int(name[2:])]
-
-    def set(self, name, value):
-        self.gp[int(name[2:])] = value
+REGISTERS = operations.RegisterLayout(['$a' + str(num) for num in range(16)])
 
 
 class MachineState:
     def __init__(self, memory, name=None):
         self.memory = memory
         self.name = name
-        self.regs = Registers()
+        self.regs = operations.RegisterFile(REGISTERS)
 
     def copy(self, name):
-        return MachineState(self.memory.copy(), name)
+        state = MachineState(self.memory.copy(), name)
+        state.regs = self.regs.copy()
+        return state
 
     def read_register(self, reg_spec):
         return self.regs.get(reg_spec)
@@ -32,7 +26,7 @@ class MachineState:
     def read_memory(self, base, offset, size):
         cell = self.memory.get_memory(base, offset, size)
         if cell is None:
-            return values.MemoryRead(base, offset, size)
+            return values.get_memory_read(base, offset, size)
         return cell
 
     def write_memory(self, base, offset, size, value):
@@ -50,13 +44,13 @@ class DummyMachineState:
 
     def read_register(self, reg_spec):
         self.read_places.add(reg_spec)
-        return values.UnknownValue(None)
+        return values.get_unknown(None)
 
     def write_register(self, reg_spec, value):
         self.written_places.add(reg_spec)
 
     def read_memory(self, base, offset, size):
-        return values.UnknownValue(None)
+        return values.get_unknown(None)
 
     def write_memory(self, base, offset, size, value):
         pass
@@ -76,7 +70,7 @@ class Memory:
         return Memory(self.structure)
 
     def get_cell_untracked(self, base, offset, size):
-        return values.MemoryRead(base, offset, size)
+        return values.get_memory_read(base, offset, size)
 
 
 class Environment:
@@ -0,0 +1,146 @@
+"""On-disk caches, so that repeated runs on the same input skip work done before.
+
+Parsed deasm files let runs skip text parsing. Their entries hold the columns of the InstructionStore, with function headers found in deasm next to them.
+They are keyed by a hash of the deasm contents and the architecture. FORMAT_VERSION must change whenever parsers start extracting something different or the columns change.
+
+Detected functions let runs skip structurizing functions that didn't change, e.g. after patching a few functions of a firmware image. They are keyed by a hash of the instructions in the function's flat flow graph, the architecture and the version of edeco itself, so any change to the sources invalidates them.
+
+Function summaries are keyed by the key of the function together with summaries of functions it calls, which they depend on.
+"""
+
+import os
+import marshal
+import hashlib
+import cPickle
+import tempfile
+from common.instructions import InstructionStore
+from common.graphs import iternodes
+
+
+FORMAT_VERSION = 3
+
+CHUNK_SIZE = 1 << 16
+
+
+def make_key(arch_name, *paths):
+    """Returns the key of an entry parsed with arch_name from files at paths. Files are hashed chunk by chunk, without reading them whole."""
+    digest = hashlib.sha1('edeco parse cache {0}\0{1}\0'.format(FORMAT_VERSION, arch_name))
+    for path in paths:
+        content_digest = hashlib.sha1()
+        with open(path, 'rb') as content:
+            for chunk in iter(lambda: content.read(CHUNK_SIZE), ''):
+                content_digest.update(chunk)
+        digest.update(content_digest.digest())
+    return digest.hexdigest()
+
+
+def get_path(directory, key, kind='parsed'):
+    return os.path.join(directory, '{0}.{1}'.format(key, kind))
+
+
+def load(directory, key, arch):
+    """Returns (instructions, function headers), or None if there is no usable entry."""
+    try:
+        with open(get_path(directory, key), 'rb') as entry:
+            version, columns, function_mapping = marshal.load(entry)
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+    if version != FORMAT_VERSION:
+        return None
+    return InstructionStore(arch.Instruction, columns), function_mapping
+
+
+def store(directory, key, instructions, function_mapping):
+    """instructions: an InstructionStore."""
+    write_entry(get_path(directory, key), marshal.dumps((FORMAT_VERSION, instructions.get_columns(), function_mapping)))
+
+
+def write_entry(path, data):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    # write under a temporary name first, so that concurrent runs never see a partial entry
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as entry:
+            entry.write(data)
+        os.rename(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
+
+
+tool_version = None
+
+def get_tool_version():
+    """Returns a hash of all sources of edeco."""
+    global tool_version
+    if tool_version is None:
+        root = os.path.dirname(os.path.abspath(__file__))
+        digest = hashlib.sha1()
+        for path, directories, filenames in os.walk(root):
+            directories.sort()
+            for filename in sorted(filenames):
+                if filename.endswith('.py'):
+                    with open(os.path.join(path, filename), 'rb') as source:
+                        digest.update('{0}\0{1}\0'.format(os.path.relpath(os.path.join(path, filename), root), source.read()))
+        tool_version = digest.hexdigest()
+    return tool_version
+
+
+def make_function_key(arch_name, start_address, flat_graph):
+    """Returns the key of the function found as flat_graph. Functions are the same if the same instructions at the same addresses flow the same way."""
+    digest = hashlib.sha1('edeco function cache {0}\0{1}\0{2}\0{3:x}\0'.format(FORMAT_VERSION, get_tool_version(), arch_name, start_address))
+
+    def describe(node):
+        if not hasattr(node, 'instructions') or not node.instructions.instructions:
+            return str(node)
+        return '{0:x}'.format(node.instructions.instructions[0].address)
+
+    subflows = sorted((describe(node), node) for node in iternodes(flat_graph))
+    for description, node in subflows:
+        digest.update('{0} -> {1}\0'.format(description, ' '.join(describe(following) for following in node.following)))
+        if hasattr(node, 'instructions'):
+            for instruction in node.instructions.instructions:
+                digest.update(repr((instruction.address, tuple(instruction.opcode), instruction.mnemonic, tuple(instruction.operands))))
+    return digest.hexdigest()
+
+
+def load_function(directory, key):
+    """Returns the cached function, or None."""
+    try:
+        with open(get_path(directory, key, 'function'), 'rb') as entry:
+            return cPickle.load(entry)
+    except (IOError, EOFError, cPickle.UnpicklingError, AttributeError, ImportError):
+        return None
+
+
+def store_function(directory, key, function):
+    try:
+        data = cPickle.dumps(function, cPickle.HIGHEST_PROTOCOL)
+    except RuntimeError:
+        # too deeply nested, detect it again next time
+        return
+    write_entry(get_path(directory, key, 'function'), data)
+
+
+def make_summary_key(function_key, callee_summaries):
+    """callee_summaries: address -> summary of functions called by the function, as FunctionSummary.as_tuple() gives it."""
+    digest = hashlib.sha1('edeco summary cache {0}\0{1}\0'.format(FORMAT_VERSION, function_key))
+    for address, summary in sorted(callee_summaries.items()):
+        digest.update(repr((address, summary)))
+    return digest.hexdigest()
+
+
+def load_summary(directory, key):
+    """Returns the cached summary as a tuple (see flow.summaries.FunctionSummary.from_tuple), or None."""
+    try:
+        with open(get_path(directory, key, 'summary'), 'rb') as entry:
+            return marshal.load(entry)
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+
+
+def store_summary(directory, key, summary):
+    """summary: a tuple from FunctionSummary.as_tuple()"""
+    write_entry(get_path(directory, key, 'summary'), marshal.dumps(summary))
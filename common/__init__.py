@@ -1,14 +1,22 @@
 import operations
+from flow.dataflow import ReachingDefinitions
+from flow.summaries import summarize_functions
 
 
 class MemoryStructureInstructionAnalyzer:
     def __init__(self):
         self.analyzed_operations = None
+        self.summaries = None
 
-    def find_memory_structures(self, functions):
+    def find_memory_structures(self, flat_graphs, cache_dir=None):
+        """flat_graphs: function start address -> flat flow graph
+        cache_dir: directory keeping function summaries found before
+        """
         self.analyzed_operations = []
-        for function in functions:
-            function.apply_instruction_analyzer(self.scan_instruction_block)
+        # subclasses live in the package of their architecture
+        self.summaries = summarize_functions(flat_graphs, type(self).__module__, cache_dir)
+        for flat_graph in flat_graphs.values():
+            self.scan_function(flat_graph)
 
         memory_structure = self.data_memory.find_structure()
         
@@ -17,13 +25,16 @@ class MemoryStructureInstructionAnalyzer:
                 candidate.mark_complete()
         return memory_structure
     
-    def scan_instruction_block(self, instructions):
+    def scan_function(self, flat_graph):
         """This function sucks. should be split into finding memory layout and then finding roles, naming structures and whatnot.
         """
+        definitions = ReachingDefinitions(flat_graph, self.summaries)
+        register_values = operations.RegisterValues(definitions, self.data_memory, self.summaries)
         write_candidates = []
-        for i, instruction in enumerate(instructions):
-            if instruction.stores_memory():
-                write_candidates.append(operations.MemoryAssignment(instructions, self.data_memory, i))
+        for subflow in definitions.blocks:
+            for i, instruction in enumerate(subflow.instructions.instructions):
+                if instruction.stores_memory():
+                    write_candidates.append(operations.MemoryAssignment(register_values, subflow, i, self.data_memory))
 
         for candidate in write_candidates:
             candidate.traceback()
@@ -6,9 +6,12 @@ def indent(text, prefix='    '):
                    text.split('\n'))
 
 
-class Closure:
+class Closure(object):
     """Represents a mess of flow. Ideally, it should not contain any subgraphs possible to collapse into subelements. Flow is defined by entry and exit, which are the graph nodes.
+    Attributes live in slots, subclasses must declare theirs.
     """
+    __slots__ = ('preceding', 'following', 'parent')
+
     def __init__(self, parent):
         self.preceding = []
         self.following = []
@@ -28,6 +31,8 @@ class Closure:
 
 
 class NamedClosure(Closure):
+    __slots__ = ('name',)
+
     def __init__(self, parent, name):
         Closure.__init__(self, parent)
         self.name = name
@@ -40,6 +45,8 @@ class NamedClosure(Closure):
 
 class Banana(Closure):
     """Linear flow, composed of 0 or more ordered Closures."""
+    __slots__ = ('closures',)
+
     def __init__(self, closures):
         Closure.__init__(self, None)
         self.closures = closures
@@ -57,6 +64,8 @@ class Banana(Closure):
 
 class NodeClosure(Closure):
     """Single node encapsulated into new graph structure"""
+    __slots__ = ('node',)
+
     def __init__(self, node, parent=None):
         Closure.__init__(self, parent)
         self.node = node
@@ -73,6 +82,8 @@ class NodeClosure(Closure):
 
 class LooseMess(Closure):
     """A closure with many small closures in it, in no particular order, not internally connected. Debug only"""
+    __slots__ = ('closures', 'beginnings', 'endings', 'begin', 'end')
+
     def __init__(self, closures, beginnings, endings):
         """With multiple beginnings, they MUST be flown INTO
         """
@@ -223,6 +234,8 @@ class LooseMess(Closure):
 
 class ConnectedMess(Closure):
     """A closure with many small closures in it, contains connection information."""
+    __slots__ = ('closures', 'connections')
+
     def __init__(self, bulge):
         Closure.__init__(self, None)
         if len(bulge.outside_branches) > 1:
@@ -1,5 +1,3 @@
-import pydot
-
 def path_to_edges(path):
     return [edge for edge in zip(path, path[1:])]
 
@@ -21,94 +19,328 @@ class Path:
 
 
 def iteredgepaths(graph_head, follow_iter=None):
+    """Yields Paths from graph_head to every node without next links. Walks with an explicit stack sharing one link list; yielded Paths get copies."""
     if follow_iter is None:
         follow_iter = lambda stack: (((stack[-1][1], follow), follow) for follow in stack[-1][1].following)
     
-    def make_yield(path):
-        return Path(path)
-    
-    def iterator(previous, edge, node):
-        current_path = previous + [(edge, node)]
-        
-        child_present = False
-        for next_edge, next_node in follow_iter(current_path):
-            for path in iterator(current_path, next_edge, next_node):
-                child_present = True
-                yield path
-        
-        if not child_present:
-            yield make_yield(current_path)
-    
-    return iterator([], None, graph_head)
+    path = [(None, graph_head)]
+    nexts = [iter(follow_iter(path))]
+    child_present = [False]
+    while nexts:
+        for next_edge, next_node in nexts[-1]:
+            child_present[-1] = True
+            path.append((next_edge, next_node))
+            nexts.append(iter(follow_iter(path)))
+            child_present.append(False)
+            break
+        else:
+            nexts.pop()
+            if not child_present.pop():
+                yield Path(path[:])
+            path.pop()
 
     
 def iterpaths(graph_head, follow_func=None, partial=False, on_backwards=False):
+    """Yields paths from graph_head to every node without next nodes, depth-first.
+    partial: yield every beginning of a path as well, on the way forward.
+    on_backwards: yield (path, forward) pairs, where forward is False when a path is yielded again on the way back.
+    Walks with an explicit stack sharing one path buffer, which follow_func gets. Yielded paths are copies.
+    """
     if follow_func is None:
         follow_func = lambda stack: stack[-1].following
 
-    def make_yield(path, forward):
+    path = [graph_head]
+
+    def make_yield(forward):
         if on_backwards:
-            return path, forward
-        return path
+            return path[:], forward
+        return path[:]
 
-    def iterator(previous, node):
-        current_path = previous + [node]
-        if partial:
-            yield make_yield(current_path, True)
-        
-        child_present = False
-        for next in follow_func(current_path):
-            for n in iterator(current_path, next):
-                child_present = True
-                yield n
-                
-        if not child_present and not partial:
-            yield make_yield(current_path, True)
-            if on_backwards:
-                yield make_yield(current_path, False)
-        elif on_backwards and partial:
-            yield make_yield(current_path, False)
-    return iterator([], graph_head)
+    if partial:
+        yield make_yield(True)
+    nexts = [iter(follow_func(path))]
+    child_present = [False]
+    while nexts:
+        for next in nexts[-1]:
+            child_present[-1] = True
+            path.append(next)
+            if partial:
+                yield make_yield(True)
+            nexts.append(iter(follow_func(path)))
+            child_present.append(False)
+            break
+        else:
+            nexts.pop()
+            if not child_present.pop() and not partial:
+                yield make_yield(True)
+                if on_backwards:
+                    yield make_yield(False)
+            elif on_backwards and partial:
+                yield make_yield(False)
+            path.pop()
 
 
 def iteredges(graph_head, follow_func=None):
+    """Yields every edge reachable from graph_head once, depth-first."""
     if follow_func is None:
         follow_func = lambda last: (((last, next), next) for next in last.following)
     
     visited = set()
-    def follow(last):
-        for next_edge, next_node in follow_func(last):
+    nexts = [iter(follow_func(graph_head))]
+    while nexts:
+        for next_edge, next_node in nexts[-1]:
             if next_edge not in visited:
-                yield next_edge, next_node
-    
-    def iterator(node):
-        for next_edge, next_node in follow(node):
-            visited.add(next_edge)
-            yield next_edge
-            for e in iterator(next_node):
-                yield e
-
-    return iterator(graph_head)
+                visited.add(next_edge)
+                yield next_edge
+                nexts.append(iter(follow_func(next_node)))
+                break
+        else:
+            nexts.pop()
 
 
 def iternodes(graph_head, follow_func=None):
+    """Yields every node reachable from graph_head once, depth-first. follow_func gets the path to the current node, which is only valid during the call."""
     if follow_func is None:
         follow_func = lambda stack: stack[-1].following
     
     visited = set([graph_head])
-    def follow(stack):
-        for node in follow_func(stack):
+    yield graph_head
+    path = [graph_head]
+    nexts = [iter(follow_func(path))]
+    while nexts:
+        for node in nexts[-1]:
             if node not in visited:
-                visited.add(node) # XXX: is before yield correct?
+                visited.add(node)
                 yield node
-    
-    for stack in iterpaths(graph_head, follow_func=follow, partial=True):
-        yield stack[-1]
+                path.append(node)
+                nexts.append(iter(follow_func(path)))
+                break
+        else:
+            nexts.pop()
+            path.pop()
 
 cfg_iterator = iternodes
 
+
+def reverse_postorder(root, successors):
+    """Returns nodes reachable from root in reverse postorder. successors(node) gives nodes following node."""
+    order = []
+    visited = set([root])
+    stack = [(root, iter(successors(root)))]
+    while stack:
+        node, children = stack[-1]
+        for child in children:
+            if child not in visited:
+                visited.add(child)
+                stack.append((child, iter(successors(child))))
+                break
+        else:
+            stack.pop()
+            order.append(node)
+    order.reverse()
+    return order
+
+
+def find_immediate_dominators(root, successors, predecessors):
+    """Returns a dict mapping each node reachable from root to its immediate dominator. Root is its own immediate dominator.
+    Cooper, Harvey, Kennedy: "A Simple, Fast Dominance Algorithm".
+    """
+    order = reverse_postorder(root, successors)
+    numbers = dict((node, i) for i, node in enumerate(order))
+    idom = {root: root}
+
+    def intersect(a, b):
+        while a is not b:
+            while numbers[a] > numbers[b]:
+                a = idom[a]
+            while numbers[b] > numbers[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for node in order[1:]:
+            new_idom = None
+            for preceding in predecessors(node):
+                if preceding in idom:
+                    if new_idom is None:
+                        new_idom = preceding
+                    else:
+                        new_idom = intersect(preceding, new_idom)
+            if idom.get(node) is not new_idom:
+                idom[node] = new_idom
+                changed = True
+    return idom
+
+
+def find_strongly_connected(nodes, successors):
+    """Returns strongly connected components of the graph made of nodes, as lists. Each component comes after all components reachable from it.
+    Tarjan's algorithm, without recursion.
+    """
+    numbers = {}
+    lowlinks = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in nodes:
+        if root in numbers:
+            continue
+        numbers[root] = lowlinks[root] = len(numbers)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(successors(root)))]
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in numbers:
+                    numbers[child] = lowlinks[child] = len(numbers)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors(child))))
+                    break
+                elif child in on_stack:
+                    lowlinks[node] = min(lowlinks[node], numbers[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlinks[parent] = min(lowlinks[parent], lowlinks[node])
+                if lowlinks[node] == numbers[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component.append(member)
+                        if member is node:
+                            break
+                    components.append(component)
+    return components
+
+
+class VirtualExit(object):
+    """Joins all ends of paths, so that they have a common post-dominator."""
+    __slots__ = ()
+
+    def __str__(self):
+        return 'exit'
+
+    __repr__ = __str__
+
+
+def find_post_dominator_tree(heads, follow):
+    """Finds immediate post-dominators of nodes reachable from any of heads. follow(node) gives next nodes.
+    Paths end on nodes without next nodes. Returns (post-dominator dict, virtual exit being the root of the tree).
+    """
+    exit = VirtualExit()
+    following = {exit: []}
+    preceding = {exit: []}
+    for head in heads:
+        preceding.setdefault(head, [])
+    stack = list(preceding)
+    stack.remove(exit)
+    while stack:
+        node = stack.pop()
+        nexts = following[node] = list(follow(node))
+        if not nexts:
+            nexts = [exit]
+        for next in nexts:
+            if next not in preceding:
+                preceding[next] = []
+                stack.append(next)
+            preceding[next].append(node)
+        if not following[node]:
+            following[node] = [exit]
+    # post-dominators are dominators with edges reversed
+    return find_immediate_dominators(exit, preceding.__getitem__, following.__getitem__), exit
+
+
+class DominatorTree:
+    """Dominator tree answering "does a dominate b" in constant time, by numbering nodes on entry and exit of a depth-first walk."""
+    def __init__(self, idom, root):
+        self.idom = idom
+        self.root = root
+        children = self.children = dict((node, []) for node in idom)
+        for node, parent in idom.items():
+            if node is not root:
+                children[parent].append(node)
+
+        self.entered = {}
+        self.left = {}
+        counter = 0
+        stack = [(root, iter(children[root]))]
+        self.entered[root] = counter
+        while stack:
+            node, nodes = stack[-1]
+            counter += 1
+            for child in nodes:
+                self.entered[child] = counter
+                stack.append((child, iter(children[child])))
+                break
+            else:
+                stack.pop()
+                self.left[node] = counter
+
+    def dominates(self, a, b):
+        """True if all paths to b go through a. Every node dominates itself."""
+        if a not in self.entered or b not in self.entered:
+            return False
+        return self.entered[a] <= self.entered[b] and self.left[b] <= self.left[a]
+
+    def iterdominators(self, node):
+        return iterdominators(self.idom, node)
+
+    def collapse(self, nodes, replacing, head):
+        """Replaces nodes, a part of the tree topped by head, with replacing. Numbers of head are taken over, so nodes dominated by replacing remain inside its range."""
+        self.entered[replacing] = self.entered[head]
+        self.left[replacing] = self.left[head]
+        for node in nodes:
+            del self.entered[node]
+            del self.left[node]
+        collapse_dominators(self.idom, self.children, nodes, replacing, head)
+
+    def rename(self, old, new):
+        self.entered[new] = self.entered.pop(old)
+        self.left[new] = self.left.pop(old)
+        rename_dominator(self.idom, self.children, old, new)
+
+
+def collapse_dominators(idom, children, nodes, replacing, head):
+    """Replaces nodes, a part of the dominator tree topped by head, with a single node. Whatever was dominated by nodes is dominated by replacing.
+    idom and children are updated in place. nodes must be a set.
+    """
+    parent = idom[head]
+    orphans = []
+    for node in nodes:
+        orphans.extend(child for child in children.pop(node) if child not in nodes)
+        del idom[node]
+    siblings = children[parent]
+    siblings[siblings.index(head)] = replacing
+    idom[replacing] = parent
+    children[replacing] = orphans
+    for orphan in orphans:
+        idom[orphan] = replacing
+
+
+def rename_dominator(idom, children, old, new):
+    parent = idom.pop(old)
+    siblings = children[parent]
+    siblings[siblings.index(old)] = new
+    idom[new] = parent
+    children[new] = children.pop(old)
+    for child in children[new]:
+        idom[child] = new
+
+
+def iterdominators(idom, node):
+    """Yields dominators of node from the closest one, excluding node itself and the root of the tree."""
+    parent = idom.get(node)
+    while parent is not None and idom[parent] is not parent:
+        yield parent
+        parent = idom[parent]
+
 def as_dot(filename, graph_head, marked_nodes=None, marked_edges=None):
-    print('printing {0}'.format(filename))
+    import pydot # only needed for debugging output
     if marked_edges is None:
         marked_edges = []
     if marked_nodes is None:
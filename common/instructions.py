@@ -1,4 +1,6 @@
-import operations
+import bisect
+import weakref
+from array import array
 
 
 class GenericInstruction:
@@ -17,9 +19,15 @@ class GenericInstruction:
         self.used_in = [] # list of addresses of final instructions this one contributed to
         self.replaced_by = None # an Operation that completely replaces this instruction
 
+        self.regs = None # (read, written) registers once known, False if the instruction can't be evaluated
+
     def addrtoint(self):
         return int(self.addr, 16)
 
+    def get_source(self):
+        """Returns (mnemonic, operands) the instruction was created from, which create the same instruction again."""
+        return self.mnemonic, self.operands
+
     def mark_chain(self, address):
         self.used_in.append(address)
 
@@ -36,32 +44,248 @@ class GenericInstruction:
         """
         raise NotImplementedError
 
+    def find_regs(self):
+        """Returns (read registers, written registers) as frozensets. They're found with a DummyMachineState on first use and kept, including the instruction being unsupported."""
+        if self.regs is None:
+            if self.arch is None:
+                # no machine model to evaluate on, like on vp1
+                self.regs = False
+                raise NotImplementedError
+            state = self.arch.DummyMachineState()
+            try:
+                self.evaluate(state)
+            except NotImplementedError:
+                self.regs = False
+                raise
+            self.regs = frozenset(state.get_read_places()), frozenset(state.get_written_places())
+        elif self.regs is False:
+            raise NotImplementedError
+        return self.regs
+
     def get_read_regs(self):
-        state = self.arch.DummyMachineState()
-        self.evaluate(state)
-        return state.get_read_places()
+        return self.find_regs()[0]
 
     def get_modified_regs(self):
-        state = self.arch.DummyMachineState()
-        self.evaluate(state)
-        return state.get_written_places()
-
-    def get_result_value(self, context, reg_spec):
-        instructions, index, memory = context
-        state = self.arch.MachineState(memory)
-
-        for reg in self.get_read_regs():
-            value = operations.traceback_register(context, reg)
-            try:
-                state.regs.set(reg, value)
-            except:
-                raise NotImplementedError
-        self.evaluate(state)
-        return state.regs.get(reg_spec)
+        return self.find_regs()[1]
 
     def stores_memory(self):
         return False
 
+    def loads_memory(self):
+        """Instructions loading memory have base, offset and size of the place loaded, like those storing it."""
+        return False
+
+
+class InstructionList(list):
+    """Parsed instructions of the whole program, in parsing order.
+    Carries a program-wide address -> index lookup, built once, so that flow detection doesn't scan the list for every jump.
+    """
+    def __init__(self, instructions=()):
+        list.__init__(self, instructions)
+        self.address_index = {}
+        for i, instruction in enumerate(self):
+            # first instruction wins, same as a linear scan would
+            if instruction.address not in self.address_index:
+                self.address_index[instruction.address] = i
+
+    def get_index(self, address):
+        """Raises KeyError if address is not the beginning of any instruction."""
+        return self.address_index[address]
+
+    def has_address(self, address):
+        return address in self.address_index
+
+    def get_flow(self, index):
+        return classify(self[index])
+
+    def get_mnemonic(self, index):
+        return self[index].mnemonic
+
+
+# flow kinds of instructions, as far as finding blocks and functions is concerned
+PLAIN = 0
+JUMP = 1
+CONDITIONAL_JUMP = 2
+DYNAMIC_JUMP = 3 # target not known before running
+BREAK = 4 # leaves the function, e.g. return
+CALL = 5
+DYNAMIC_CALL = 6
+UNKNOWN = 7 # instruction doesn't describe its flow, like on ISAs with branch delays
+
+
+def classify(instruction):
+    """Returns (flow kind, target address or None)."""
+    if not hasattr(instruction, 'jumps'):
+        return UNKNOWN, None
+    if instruction.jumps():
+        if not isinstance(instruction.target, (int, long)):
+            return DYNAMIC_JUMP, None
+        if instruction.is_conditional():
+            return CONDITIONAL_JUMP, instruction.target
+        return JUMP, instruction.target
+    if instruction.breaks_function():
+        return BREAK, None
+    if instruction.calls_function():
+        if not isinstance(instruction.function, (int, long)):
+            return DYNAMIC_CALL, None
+        return CALL, instruction.function
+    return PLAIN, None
+
+
+class AddressLookupMixIn:
+    """Sequence of instructions created on first use by get_instruction(index), with addresses kept in self.addresses.
+    Addresses are found by bisection, or in self.address_index once build_address_index was called for addresses that don't ascend.
+    """
+    def build_address_index(self):
+        self.address_index = {}
+        for i, address in enumerate(self.addresses):
+            # first instruction wins, same as in InstructionList
+            if address not in self.address_index:
+                self.address_index[address] = i
+
+    def get_index(self, address):
+        """Raises KeyError if address is not the beginning of any instruction."""
+        if self.address_index is not None:
+            return self.address_index[address]
+        return bisect_address(self.addresses, address)
+
+    def has_address(self, address):
+        try:
+            self.get_index(address)
+        except KeyError:
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.get_instruction(i) for i in xrange(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.get_instruction(index)
+
+    def __iter__(self):
+        for i in xrange(len(self)):
+            yield self.get_instruction(i)
+
+
+class InstructionStore(AddressLookupMixIn):
+    """Parsed instructions of the whole program, kept in columns instead of objects, for programs with millions of instructions.
+    Fields of each instruction are packed into arrays and joined strings, mnemonics are stored as ids. Flow kinds and targets are recorded when instructions are added, so finding blocks and functions never creates instruction objects.
+    Indexing creates instruction objects with make_instruction, the Instruction function of an architecture, from the mnemonic and operands they were created from (e.g. 'repz' and ['retq'] for a prefixed instruction). Objects stay shared while something holds them, so marks made on them aren't lost.
+    Addresses are looked up by bisection while they come in ascending order.
+    """
+    def __init__(self, make_instruction, columns=None):
+        self.make_instruction = make_instruction
+        self.instances = weakref.WeakValueDictionary()
+        if columns is None:
+            # addresses and targets are 64-bit on LP64, there's no 'Q' in array
+            columns = array('L').tostring(), '', array('I').tostring(), array('B').tostring(), array('I').tostring(), [], array('H').tostring(), '', array('I').tostring(), array('B').tostring(), array('l').tostring()
+        self.set_columns(columns)
+
+    def set_columns(self, columns):
+        addresses, addr_texts, addr_text_ends, opcodes, opcode_ends, mnemonics, mnemonic_ids, operands, operand_ends, kinds, targets = columns
+        self.addresses = array('L', addresses)
+        self.addr_texts = array('c', addr_texts)
+        self.addr_text_ends = array('I', addr_text_ends)
+        self.opcodes = array('B', opcodes)
+        self.opcode_ends = array('I', opcode_ends)
+        self.mnemonics = list(mnemonics)
+        self.mnemonic_ids = array('H', mnemonic_ids)
+        self.mnemonic_table = dict((mnemonic, i) for i, mnemonic in enumerate(self.mnemonics))
+        # operands of an instruction are joined with '\1', those of all instructions are concatenated
+        self.operands = array('c', operands)
+        self.operand_ends = array('I', operand_ends)
+        self.kinds = array('B', kinds)
+        self.targets = array('l', targets)
+
+        self.address_index = None
+        self.ascending = all(self.addresses[i] < self.addresses[i + 1] for i in xrange(len(self.addresses) - 1))
+        if not self.ascending:
+            self.build_address_index()
+
+    def get_columns(self):
+        """Returns the contents as strings and lists, which marshal can save."""
+        return (self.addresses.tostring(), self.addr_texts.tostring(), self.addr_text_ends.tostring(), self.opcodes.tostring(), self.opcode_ends.tostring(), self.mnemonics,
+                self.mnemonic_ids.tostring(), self.operands.tostring(), self.operand_ends.tostring(), self.kinds.tostring(), self.targets.tostring())
+
+    def __getstate__(self):
+        return self.make_instruction, self.get_columns()
+
+    def __setstate__(self, state):
+        make_instruction, columns = state
+        self.__init__(make_instruction, columns)
+
+    def append(self, instruction):
+        address = instruction.address
+        if self.addresses and self.ascending and address <= self.addresses[-1]:
+            self.ascending = False
+            self.build_address_index()
+        if self.address_index is not None and address not in self.address_index:
+            self.address_index[address] = len(self.addresses)
+        self.addresses.append(address)
+
+        self.addr_texts.fromstring(instruction.addr)
+        self.addr_text_ends.append(len(self.addr_texts))
+        self.opcodes.extend(instruction.opcode)
+        self.opcode_ends.append(len(self.opcodes))
+        mnemonic, operands = instruction.get_source()
+        mnemonic_id = self.mnemonic_table.get(mnemonic)
+        if mnemonic_id is None:
+            mnemonic_id = self.mnemonic_table[mnemonic] = len(self.mnemonics)
+            self.mnemonics.append(mnemonic)
+        self.mnemonic_ids.append(mnemonic_id)
+        self.operands.fromstring('\1'.join(operands))
+        self.operand_ends.append(len(self.operands))
+
+        kind, target = classify(instruction)
+        self.kinds.append(kind)
+        self.targets.append(target if target is not None else 0)
+
+    def get_flow(self, index):
+        """Returns (flow kind, target address or None), without creating the instruction."""
+        kind = self.kinds[index]
+        if kind in (JUMP, CONDITIONAL_JUMP, CALL):
+            return kind, self.targets[index]
+        return kind, None
+
+    def get_mnemonic(self, index):
+        return self.mnemonics[self.mnemonic_ids[index]]
+
+    def get_instruction(self, index):
+        instruction = self.instances.get(index)
+        if instruction is None:
+            def get_range(ends):
+                return (ends[index - 1] if index else 0), ends[index]
+            start, end = get_range(self.addr_text_ends)
+            addr = self.addr_texts[start:end].tostring()
+            start, end = get_range(self.opcode_ends)
+            opcode = tuple(self.opcodes[start:end])
+            start, end = get_range(self.operand_ends)
+            operands = self.operands[start:end].tostring()
+            operands = operands.split('\1') if operands else []
+            instruction = self.instances[index] = self.make_instruction(addr, opcode, self.get_mnemonic(index), operands)
+        return instruction
+
+
+def bisect_address(addresses, address):
+    """Returns the index of the first of ascending addresses equal to address. Raises KeyError if there's none."""
+    i = bisect.bisect_left(addresses, address)
+    if i == len(addresses) or addresses[i] != address:
+        raise KeyError(address)
+    return i
+
+
+def indexed(instructions):
+    """Returns instructions as an InstructionList, unless they already look up addresses themselves (InstructionList, InstructionStore, parsers.index.LazyInstructions)."""
+    if hasattr(instructions, 'get_index'):
+        return instructions
+    return InstructionList(instructions)
+
 
 def Instruction(architecture, address, opcode, mnemonic, operands, instruction_map, default_class):
     """Creates instructions based on instruction_map"""
@@ -1,33 +1,168 @@
 #!/usr/bin/env python
 
 import sys
-from flow import detect_function, FlowDetectionError
+import Queue
+import cPickle
+import importlib
+import traceback
+import multiprocessing
+from flow import detect_flat_flow, structurize_flow, FlowDetectionError
 import memory
+import cache
 import argparse
-import parsers
+import parsers.common
+import parsers.index
+import flow.calls
+import flow.summaries
+import flow.tracing
+from common.instructions import indexed
 
 
-def find_functions(arch, instructions, function_addrs):
-    functions = []
-    for address in sorted(function_addrs):
+def find_functions(arch, instructions, function_addrs, jobs=1, cache_dir=None, whole_program=True):
+    """Detects functions at function_addrs, bottom-up in their call graph: callees before callers. Returns them sorted by address.
+    With jobs > 1, functions whose callees are done are spread across as many processes.
+    cache_dir: directory keeping functions detected before, reused if their instructions didn't change. Summaries of the functions are kept there too, for memory structure analyzers given the same directory.
+    whole_program: find basic blocks of all instructions at once. Without it, each function is emulated only as far as it reaches.
+    """
+    # index addresses once for all functions
+    instructions = indexed(instructions)
+    block_table = None
+    if whole_program:
+        # find basic blocks once for all functions
+        block_table = arch.find_blocks(instructions)
+    addresses = sorted(function_addrs)
+
+    # flat flow of all functions gives the call graph
+    results = {}
+    flat_graphs = {}
+    for address in addresses:
         try:
-            print('finding function at 0x{0:x}'.format(address))
-            functions.append(detect_function(arch, instructions, address))
+            flat_graphs[address] = detect_flat_flow(arch, instructions, address, block_table)
         except FlowDetectionError as e:
-            print(e)
+            results[address] = None, str(e)
+    call_graph = flow.calls.CallGraph(flat_graphs)
+    if cache_dir is not None:
+        # structurizing takes flat graphs apart, summaries go first
+        flow.summaries.summarize_functions(flat_graphs, arch.__name__, cache_dir)
+
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs, init_worker, (arch.__name__, flat_graphs, cache_dir))
+        try:
+            results.update(find_functions_in_pool(pool, call_graph))
+        finally:
+            pool.terminate()
+    else:
+        for address in call_graph.iter_bottom_up():
+            results[address] = find_function(arch, address, flat_graphs.pop(address), cache_dir)
+    return collect_functions(addresses, results, arch, flat_graphs, cache_dir)
+
+
+# seconds to wait for a function before checking that workers are still there
+WORKER_CHECK_INTERVAL = 1
+
+
+def find_functions_in_pool(pool, call_graph):
+    """Returns address -> result of find_function_in_worker. Functions go to workers as soon as all functions they call are done."""
+    schedule = flow.calls.BottomUpSchedule(call_graph)
+    done = Queue.Queue()
+    # the pool replaces workers that die, and their functions never come back
+    workers = list(pool._pool)
+
+    def submit(addresses):
+        for address in addresses:
+            pool.apply_async(find_function_in_worker, (address,), callback=done.put)
+
+    results = {}
+    submit(schedule.start())
+    while len(results) < len(call_graph):
+        try:
+            address, result, failure = done.get(timeout=WORKER_CHECK_INTERVAL)
+        except Queue.Empty:
+            if not all(worker.is_alive() for worker in workers):
+                raise RuntimeError('Worker process exited while finding functions')
+            continue
+        if failure is not None:
+            raise RuntimeError('Finding function at 0x{0:x} failed in worker:\n{1}'.format(address, failure))
+        results[address] = result
+        submit(schedule.finish(address))
+    return results
+
+
+def find_function(arch, address, flat_graph, cache_dir=None):
+    """Structurizes flat_graph of the function at address. Returns (function, None), or (None, error message) if flow can't be detected."""
+    try:
+        if cache_dir is None:
+            return structurize_flow(address, flat_graph), None
+        key = cache.make_function_key(arch.__name__, address, flat_graph)
+        function = cache.load_function(cache_dir, key)
+        if function is None:
+            function = structurize_flow(address, flat_graph)
+            cache.store_function(cache_dir, key, function)
+        return function, None
+    except FlowDetectionError as e:
+        return None, str(e)
+
+
+def collect_functions(addresses, results, arch, flat_graphs, cache_dir):
+    """results: address -> result of find_function or find_function_in_worker. flat_graphs: flat flow of functions workers couldn't send back."""
+    functions = []
+    for address in addresses:
+        print('finding function at 0x{0:x}'.format(address))
+        function, error = results[address]
+        if isinstance(function, str):
+            function = cPickle.loads(function)
+        elif function is None and error is None:
+            # worker couldn't send it back
+            function, error = find_function(arch, address, flat_graphs[address], cache_dir)
+        if error is not None:
+            print(error)
+        else:
+            functions.append(function)
     return functions
 
 
+# set up in every worker process by init_worker
+worker_context = None
+
+def init_worker(arch_name, flat_graphs, cache_dir):
+    global worker_context
+    worker_context = importlib.import_module(arch_name), flat_graphs, cache_dir
+
+
+def find_function_in_worker(address):
+    """Same as find_function, but the function comes back pickled, or None if it's too deeply nested to pickle.
+    Returns (address, result, None), or (address, None, traceback) if it failed.
+    """
+    arch, flat_graphs, cache_dir = worker_context
+    try:
+        function, error = find_function(arch, address, flat_graphs[address], cache_dir)
+        if function is not None:
+            try:
+                function = cPickle.dumps(function, cPickle.HIGHEST_PROTOCOL)
+            except RuntimeError:
+                function = None
+    except Exception:
+        # apply_async has no error callback in Python 2, failures are sent back as results
+        return address, None, traceback.format_exc()
+    return address, (function, error), None
+
+
 if __name__ == '__main__':
     arg_parser = argparse.ArgumentParser(description="Detects control flow in assembly files.")
     arg_parser.add_argument('-m', '--microcode', type=str, choices=['fuc', 'xtensa', 'vp1', 'x86_64'], required=True, help='microcode name')
     arg_parser.add_argument('--cmap', type=str, help='code space map file')
-    arg_parser.add_argument('-x', '--no-autodetect', action='store_true', default=False, help="Don't autodetect functions")
-    arg_parser.add_argument('deasm', type=str, help='input deasm file')
+    arg_parser.add_argument('-x', '--no-autodetect', action='store_true', default=False, help="Don't autodetect functions. Only lines reached from given functions get parsed, found through an index written next to deasm as DEASM.index")
+    arg_parser.add_argument('deasm', type=str, help='input deasm file, - for standard input')
     arg_parser.add_argument('deco', type=str, help='output decompiled file')
     arg_parser.add_argument('-f', '--function', action="append", help="Function address: decimal (123) or hex (0x12ab)")
+    arg_parser.add_argument('-j', '--jobs', type=int, default=1, help="Number of processes detecting functions in parallel")
+    arg_parser.add_argument('--cache', type=str, help="Directory keeping parsed input files and detected functions, to skip finding them again")
+    arg_parser.add_argument('--trace', type=str, help="Directory to write structurizer steps of every function to, as .dot graphs and logs")
     args = arg_parser.parse_args()
 
+    if args.trace:
+        flow.tracing.set_sink(flow.tracing.DirectoryTrace(args.trace))
+
     if args.microcode == 'fuc':
         import fuc as arch
         import parsers.envydis as insn_parser
@@ -40,20 +175,39 @@ if __name__ == '__main__':
     elif args.microcode == 'x86_64':
         if args.cmap:
             raise Exception("cmap file not supported on x86_64")
-        if not args.no_autodetect:
-            args.cmap = args.deasm
         import arches.x86_64 as arch
         from parsers import objdump as insn_parser
     else:
         raise ValueError("ISA {0} unsupported".format(args.microcode))
     
-    # input file
-    with open(args.deasm) as deasm:
-        data = deasm.readlines()
+    # with functions given by hand, only lines their flow reaches get parsed, found through the index of deasm
+    lazy = args.no_autodetect and args.deasm != '-'
 
-    instructions = insn_parser.parse_instructions(arch, data)
+    # otherwise input file is parsed as it's read. Standard input can't be read again, so it's never cached
+    parsed = None
+    cache_key = None
+    if lazy:
+        parsed = parsers.index.open_indexed(insn_parser, arch, args.deasm), {}
+    elif args.cache and args.deasm != '-':
+        cache_key = cache.make_key(args.microcode, args.deasm)
+        parsed = cache.load(args.cache, cache_key, arch)
+
+    if parsed is not None:
+        instructions, function_headers = parsed
+    else:
+        deasm = parsers.common.open_deasm(args.deasm)
+        try:
+            instructions, function_headers = insn_parser.parse_deasm(arch, deasm)
+        finally:
+            if deasm is not sys.stdin:
+                deasm.close()
+
+        if cache_key is not None:
+            cache.store(args.cache, cache_key, instructions, function_headers)
 
     function_mapping = {}
+    if not args.no_autodetect:
+        function_mapping.update(function_headers)
     if args.cmap:
         with open(args.cmap) as cmap:
             for line in cmap:
@@ -80,7 +234,7 @@ if __name__ == '__main__':
     function_addrs = set(addrs)
     if not args.no_autodetect:
         function_addrs.update(arch.find_function_addresses(instructions))
-    functions = find_functions(arch, instructions, function_addrs)
+    functions = find_functions(arch, instructions, function_addrs, args.jobs, args.cache, not lazy)
     
     # functions are now basic nested graphs of flow
 
@@ -1,6 +1,8 @@
 # --- *coding=UTF-8* ---
 import emulator
+import blocks
 import structurizer
+import tracing
 from common import closures
 from exceptions import *
 
@@ -37,7 +39,20 @@ def into_function(address, nested_graph):
     return Function(address, nested_graph.closures)
 
 
-def detect_function(arch, instructions, start_address):
-    flat_graph = arch.detect_flow(instructions, start_address)
+def detect_flat_flow(arch, instructions, start_address, block_table=None):
+    """block_table: result of arch.find_blocks shared between functions, if the architecture supports it."""
+    if block_table is None:
+        return arch.detect_flow(instructions, start_address)
+    return block_table.function_flow(start_address)
+
+
+def structurize_flow(start_address, flat_graph):
+    tracing.sink.start_function(start_address)
     nested_graph = structurizer.structurize(flat_graph)
     return into_function(start_address, nested_graph)
+
+
+def detect_function(arch, instructions, start_address, block_table=None):
+    """Finds the flat flow graph of the function at start_address and structurizes it."""
+    flat_graph = detect_flat_flow(arch, instructions, start_address, block_table)
+    return structurize_flow(start_address, flat_graph)
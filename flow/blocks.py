@@ -0,0 +1,158 @@
+"""Whole-program basic block discovery. Instructions are scanned once: every branch target, instruction after a branch or return and call target starts a block. Flat flow graphs of single functions are then assembled from this table without emulating instructions again.
+
+Blocks in the table are split more finely than a single function needs (e.g. by targets of other functions jumping into shared code), so assembling a function merges those straight links back. The result is the same graph FunctionFlowEmulator would find.
+Only suitable for ISAs where SimpleEmulator is: no branch delays, instructions compatible with FlowInstructionMixIn.
+"""
+
+from exceptions import *
+from emulator import add_edge, Instructions, Subflow, StartNode, EndNode
+from common.instructions import indexed, JUMP, CONDITIONAL_JUMP, DYNAMIC_JUMP, BREAK, CALL
+import bisect
+
+
+class Block(object):
+    """Instructions [start_index, end_index) of the whole program, entered only at the beginning.
+    successors are indices of blocks executed next, in order: fallthrough first, then jump target.
+    """
+    __slots__ = ('start_index', 'end_index', 'successors', 'jumps', 'returns', 'error')
+
+    def __init__(self, start_index, end_index):
+        self.start_index = start_index
+        self.end_index = end_index
+        self.successors = []
+        self.jumps = False # successors are targets of a branch, not a simple fallthrough
+        self.returns = False
+        self.error = None # error to raise when a function reaches this block, after following successors
+
+
+class BlockTable:
+    def __init__(self, instructions):
+        self.instructions = indexed(instructions)
+        self.starts = []
+        self.blocks = {}
+        self.find_blocks(self.find_leaders())
+
+    def find_leaders(self):
+        instructions = self.instructions
+        leaders = set([0])
+        for i in xrange(len(instructions)):
+            kind, target = instructions.get_flow(i)
+            if kind in (JUMP, CONDITIONAL_JUMP, DYNAMIC_JUMP, BREAK):
+                leaders.add(i + 1)
+            if kind in (JUMP, CONDITIONAL_JUMP, CALL) and instructions.has_address(target):
+                leaders.add(instructions.get_index(target))
+        leaders.discard(len(instructions))
+        return sorted(leaders)
+
+    def find_blocks(self, leaders):
+        instructions = self.instructions
+        if not leaders:
+            # no instructions at all
+            return
+        stream_end = ValueError("Emulation can't continue - the instruction stream ends unexpectedly at {0:x}.".format(instructions[-1].address))
+        for start_index, end_index in zip(leaders, leaders[1:] + [len(instructions)]):
+            block = Block(start_index, end_index)
+            kind, target = instructions.get_flow(end_index - 1)
+            falls_through = end_index < len(instructions)
+            if kind in (JUMP, CONDITIONAL_JUMP, DYNAMIC_JUMP):
+                block.jumps = True
+                if kind == DYNAMIC_JUMP:
+                    block.error = EmulationUnsupported("Function can't be traced, contains a dynamic jump at 0x{0:x}.".format(instructions[end_index - 1].address))
+                elif kind == CONDITIONAL_JUMP and not falls_through:
+                    block.error = stream_end
+                elif not instructions.has_address(target):
+                    block.error = FunctionBoundsException("Address 0x{0:x} out of this code block.".format(target))
+                    if kind == CONDITIONAL_JUMP:
+                        # fallthrough gets followed before the target is found missing
+                        block.successors.append(end_index)
+                else:
+                    if kind == CONDITIONAL_JUMP:
+                        block.successors.append(end_index)
+                    block.successors.append(instructions.get_index(target))
+            elif kind == BREAK:
+                block.returns = True
+            elif falls_through:
+                block.successors.append(end_index)
+            else:
+                block.error = stream_end
+            self.starts.append(start_index)
+            self.blocks[start_index] = block
+
+    def find_block(self, index):
+        """Returns the block containing instruction indexed with index."""
+        return self.blocks[self.starts[bisect.bisect_right(self.starts, index) - 1]]
+
+    def function_flow(self, start_address):
+        """Creates a flat flow graph of the function starting at start_address."""
+        try:
+            entry = self.instructions.get_index(start_address)
+        except KeyError:
+            raise FunctionBoundsException("Address 0x{0:x} out of this code block.".format(start_address))
+
+        def get_piece(index):
+            """Returns (end index, block) of the reachable piece of code starting at index."""
+            block = self.find_block(index)
+            if index < entry < block.end_index:
+                # entry cuts a table block in two, the first part falls through into it
+                return entry, None
+            return block.end_index, block
+
+        # find reachable pieces and which of them must start a subflow
+        pieces = {}
+        leaders = set([entry])
+        stack = [entry]
+        while stack:
+            index = stack.pop()
+            if isinstance(index, Exception):
+                raise index
+            if index in pieces:
+                continue
+            end_index, block = pieces[index] = get_piece(index)
+            if block is None:
+                successors = [end_index]
+            else:
+                if block.error is not None:
+                    if not block.successors:
+                        raise block.error
+                    stack.append(block.error)
+                successors = block.successors
+                if block.jumps:
+                    leaders.update(successors)
+            stack.extend(reversed(successors))
+
+        # merge straight links between pieces into subflows
+        subflows = {}
+        last_pieces = {}
+        for leader in leaders:
+            index = leader
+            while True:
+                end_index, block = pieces[index]
+                if block is not None and (block.jumps or block.returns) or end_index in leaders:
+                    break
+                index = end_index
+            subflows[leader] = Subflow(Instructions(self.instructions[leader:end_index], leader, end_index))
+            last_pieces[leader] = block
+
+        head = StartNode()
+        end = EndNode()
+        add_edge(head, subflows[entry])
+        visited = set([entry])
+        stack = [entry]
+        while stack:
+            leader = stack.pop()
+            subflow = subflows[leader]
+            block = last_pieces[leader]
+            if block is None:
+                successors = [subflow.instructions.end_index]
+            elif block.returns:
+                add_edge(subflow, end)
+                continue
+            else:
+                successors = block.successors
+            for successor in successors:
+                add_edge(subflow, subflows[successor])
+            for successor in reversed(successors):
+                if successor not in visited:
+                    visited.add(successor)
+                    stack.append(successor)
+        return head
@@ -0,0 +1,80 @@
+"""Call graph of detected functions, so that functions get analysed bottom-up: callees before their callers.
+
+Functions calling each other, directly or through others, form strongly connected components. Components are ordered so that each one comes after all components it calls. Functions of a component go together, once all components they call are done, so that analyses can rely on results of callees.
+"""
+
+from common.graphs import iternodes, find_strongly_connected
+from common.instructions import classify, CALL
+
+
+def find_calls(flat_graph):
+    """Returns addresses of functions called directly from the flat flow graph of a function."""
+    calls = set()
+    for node in iternodes(flat_graph):
+        if hasattr(node, 'instructions'):
+            for instruction in node.instructions.instructions:
+                kind, target = classify(instruction)
+                if kind == CALL:
+                    calls.add(target)
+    return calls
+
+
+class CallGraph:
+    def __init__(self, flat_graphs):
+        """flat_graphs: function start address -> flat flow graph. Calls to other addresses are left out."""
+        addresses = sorted(flat_graphs)
+        self.callees = {}
+        for address in addresses:
+            self.callees[address] = sorted(target for target in find_calls(flat_graphs[address]) if target in flat_graphs)
+
+        self.components = [sorted(component) for component in find_strongly_connected(addresses, self.callees.__getitem__)]
+        self.component_of = {}
+        for i, component in enumerate(self.components):
+            for address in component:
+                self.component_of[address] = i
+
+        self.callers = [set() for component in self.components] # component -> components calling it
+        for address, callees in self.callees.iteritems():
+            for callee in callees:
+                if self.component_of[callee] != self.component_of[address]:
+                    self.callers[self.component_of[callee]].add(self.component_of[address])
+
+    def __len__(self):
+        return len(self.callees)
+
+    def iter_bottom_up(self):
+        """Yields function addresses, callees first."""
+        for component in self.components:
+            for address in component:
+                yield address
+
+
+class BottomUpSchedule:
+    """Hands out functions whose callees are all done, to be analysed concurrently."""
+    def __init__(self, call_graph):
+        self.call_graph = call_graph
+        self.waiting = [0] * len(call_graph.components) # component -> called components not done yet
+        for callers in call_graph.callers:
+            for caller in callers:
+                self.waiting[caller] += 1
+        self.left = [len(component) for component in call_graph.components] # component -> functions not done yet
+
+    def start(self):
+        """Returns addresses of functions that call nothing left to do."""
+        ready = []
+        for i, component in enumerate(self.call_graph.components):
+            if not self.waiting[i]:
+                ready.extend(component)
+        return ready
+
+    def finish(self, address):
+        """Marks the function at address done. Returns addresses of functions that became ready because of it."""
+        component = self.call_graph.component_of[address]
+        self.left[component] -= 1
+        ready = []
+        if not self.left[component]:
+            for caller in self.call_graph.callers[component]:
+                self.waiting[caller] -= 1
+                if not self.waiting[caller]:
+                    ready.extend(self.call_graph.components[caller])
+        return ready
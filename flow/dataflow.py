@@ -0,0 +1,131 @@
+"""Reaching definitions of registers over the flat flow graph of a function.
+
+A definition is the position of an instruction writing a register: (subflow, index in subflow's instructions). ENTRY stands for the value a register has when the function starts.
+Definitions reaching the beginning of each subflow are found once for the whole function, by iterating over subflows in reverse postorder until nothing changes. Inside a subflow, the closest earlier write wins, found by bisection.
+Instructions that can't tell which registers they write (NotImplementedError) are taken to write all of them. Calls write the registers in the summary of the called function, if there is one (see flow.summaries).
+"""
+
+import bisect
+from common.graphs import iternodes, reverse_postorder
+from common.instructions import classify, CALL
+
+
+ENTRY = 'entry'
+
+
+def meet(states):
+    """Joins register -> definitions maps coming from several places. The None key holds definitions of registers not listed."""
+    if len(states) == 1:
+        return states[0]
+    registers = set()
+    for state in states:
+        registers.update(state)
+    joined = {}
+    for register in registers:
+        definitions = set()
+        for state in states:
+            definitions.update(state.get(register, state.get(None, ())))
+        joined[register] = frozenset(definitions)
+    return joined
+
+
+def find_call_summary(instruction, summaries):
+    """Returns the summary of the function instruction calls, or None if it doesn't call a function in summaries."""
+    if summaries:
+        kind, target = classify(instruction)
+        if kind == CALL:
+            return summaries.get(target)
+    return None
+
+
+def find_written(instruction, summaries):
+    """Returns registers instruction may write, or None if it's not known."""
+    summary = find_call_summary(instruction, summaries)
+    if summary is not None:
+        return summary.written
+    try:
+        return instruction.get_modified_regs()
+    except NotImplementedError:
+        return None
+
+
+class BlockDefinitions:
+    """Writes of registers inside a single subflow."""
+    def __init__(self, subflow, summaries=None):
+        self.subflow = subflow
+        self.by_register = {} # register -> ascending indices of instructions writing it
+        self.everything = [] # ascending indices of instructions writing any register
+        for i, instruction in enumerate(subflow.instructions.instructions):
+            registers = find_written(instruction, summaries)
+            if registers is None:
+                self.everything.append(i)
+                continue
+            for register in registers:
+                self.by_register.setdefault(register, []).append(i)
+
+    def find_last(self, register, index):
+        """Returns the index of the last instruction before index writing register, or None."""
+        last = None
+        for indices in (self.by_register.get(register, ()), self.everything):
+            position = bisect.bisect_left(indices, index)
+            if position and (last is None or indices[position - 1] > last):
+                last = indices[position - 1]
+        return last
+
+    def apply(self, state):
+        """Returns the state after all instructions of the subflow."""
+        if self.everything:
+            last_unknown = self.everything[-1]
+            state = {None: frozenset([(self.subflow, last_unknown)])}
+        else:
+            last_unknown = -1
+            state = dict(state)
+        for register, indices in self.by_register.iteritems():
+            if indices[-1] > last_unknown:
+                state[register] = frozenset([(self.subflow, indices[-1])])
+        return state
+
+
+class ReachingDefinitions:
+    def __init__(self, flat_graph, summaries=None):
+        """summaries: address -> flow.summaries.FunctionSummary of called functions"""
+        self.blocks = {}
+        for node in iternodes(flat_graph):
+            if hasattr(node, 'instructions'):
+                self.blocks[node] = BlockDefinitions(node, summaries)
+
+        self.entering = {}
+        order = reverse_postorder(flat_graph, lambda node: node.following)
+        leaving = {flat_graph: {None: frozenset([ENTRY])}}
+        changed = True
+        while changed:
+            changed = False
+            for node in order:
+                if node not in self.blocks:
+                    continue
+                state = meet([leaving[preceding] for preceding in node.preceding if preceding in leaving])
+                if self.entering.get(node) != state:
+                    self.entering[node] = state
+                    leaving[node] = self.blocks[node].apply(state)
+                    changed = True
+
+    def get_definitions(self, subflow, index, register):
+        """Returns positions of instructions that may have written register last before instruction index of subflow. May contain ENTRY."""
+        last = self.blocks[subflow].find_last(register, index)
+        if last is not None:
+            return frozenset([(subflow, last)])
+        state = self.entering[subflow]
+        return state.get(register, state.get(None, frozenset()))
+
+    def get_single_definition(self, subflow, index, register):
+        """Returns the position of the only write of register reaching instruction index of subflow. None if there are more or register may come from function entry."""
+        definitions = self.get_definitions(subflow, index, register)
+        if len(definitions) != 1 or ENTRY in definitions:
+            return None
+        return next(iter(definitions))
+
+    def writes_everything(self, subflow, index):
+        """True if the instruction doesn't tell which registers it writes."""
+        everything = self.blocks[subflow].everything
+        position = bisect.bisect_left(everything, index)
+        return position < len(everything) and everything[position] == index
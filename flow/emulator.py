@@ -1,4 +1,5 @@
 from exceptions import *
+from common.instructions import indexed, JUMP, CONDITIONAL_JUMP, DYNAMIC_JUMP, BREAK
 
 def add_edge(from_, to):
     '''    if to in from_.following:
@@ -9,7 +10,9 @@ def add_edge(from_, to):
     to.preceding.append(from_)
 
 
-class Instructions:
+class Instructions(object):
+    __slots__ = ('instructions', 'start_index', 'end_index')
+
     def __init__(self, instructions, start_index, end_index):
         self.instructions = instructions
         self.start_index = start_index
@@ -26,11 +29,14 @@ class Instructions:
         return Instructions(instructions, index, self.end_index)
 
 
-class Node:
-    pass
+class Node(object):
+    """Nodes of flow graphs are created and relinked very often, so they keep attributes in slots instead of a __dict__."""
+    __slots__ = ('following', 'preceding')
 
 
 class Subflow(Node):
+    __slots__ = ('instructions',)
+
     def __init__(self, instructions):
         self.instructions = instructions
         self.following = []
@@ -57,6 +63,8 @@ class Subflow(Node):
 
 
 class StartNode(Node):
+    __slots__ = ()
+
     def __init__(self):
         self.following = []
         self.preceding = []
@@ -72,6 +80,8 @@ class StartNode(Node):
 
 
 class EndNode(Node):
+    __slots__ = ()
+
     def __init__(self):
         self.preceding = []
         self.following = []
@@ -85,6 +95,35 @@ class EndNode(Node):
         return neighbors
 
 
+class SubflowIndex:
+    """Maps indices of committed instructions to subflows containing them.
+    Indices of a subflow share a single cell holding it, so that a split only relabels the shorter of the two parts.
+    """
+    def __init__(self):
+        self.cells = {}
+
+    def add(self, subflow):
+        instructions = subflow.instructions
+        self.cells.update(dict.fromkeys(xrange(instructions.start_index, instructions.end_index), [subflow]))
+
+    def split(self, presubflow, subflow):
+        """Registers a split: presubflow took over the beginning of subflow, which now starts later."""
+        before = presubflow.instructions
+        after = subflow.instructions
+        cell = self.cells[before.start_index]
+        if before.end_index - before.start_index <= after.end_index - after.start_index:
+            self.add(presubflow)
+        else:
+            cell[0] = presubflow
+            self.add(subflow)
+
+    def find(self, index):
+        cell = self.cells.get(index)
+        if cell is None:
+            return None
+        return cell[0]
+
+
 class FlowInstructionMixIn:
     """Mixin instructions compatible with FunctionFlowEmulator."""
     def jumps(self):
@@ -123,33 +162,21 @@ class FunctionFlowEmulator:
     """Chosen: store subflows normally, separate following (splits) and preceding (joins) flows, make no exception for "straight" flow.
     """
     def __init__(self, instructions, start_address):
-        self.instructions = instructions
+        self.instructions = indexed(instructions)
         self.flow = StartNode()
         self._end = EndNode()
+        self._subflows = SubflowIndex()
         self.find(self.get_index(start_address))
 
     def get_index(self, address):
-        for i, instr in enumerate(self.instructions):
-            if instr.address == address:
-                return i
-        raise FunctionBoundsException("Address 0x{0:x} out of this code block.".format(address))
+        try:
+            return self.instructions.get_index(address)
+        except KeyError:
+            raise FunctionBoundsException("Address 0x{0:x} out of this code block.".format(address))
 
     def find_existing_subflow(self, index):
-        """BFS over the whole graph to find the subflow node containing instruction indexed with index."""
-        nodes = [self.flow]
-        traversed_nodes = set()
-        while nodes:
-            new_nodes = []
-            for node in nodes:
-                if not isinstance(node, StartNode) and not isinstance(node, EndNode):
-                    if node.instructions.start_index <= index < node.instructions.end_index:
-                        return node
-                if not isinstance(node, EndNode):
-                    followers = frozenset(node.following).difference(traversed_nodes)
-                    traversed_nodes.update(followers)
-                    new_nodes.extend(list(followers))
-            nodes = new_nodes
-        return None
+        """Finds the subflow node containing instruction indexed with index."""
+        return self._subflows.find(index)
 
     def find(self, start_index):
         self.find_subflow(self.flow, start_index)
@@ -159,6 +186,7 @@ class FunctionFlowEmulator:
         instructions = Instructions(self.instructions[start_index:end_index + 1], start_index, end_index + 1)
         subflow = Subflow(instructions)
         add_edge(source_node, subflow)
+        self._subflows.add(subflow)
         return subflow
 
     def find_subflow(self, source, start_index):
@@ -179,6 +207,7 @@ class FunctionFlowEmulator:
                     preceding.following.append(presubflow)
                 subflow.cut_before_index(start_index)
                 add_edge(presubflow, subflow)
+                self._subflows.split(presubflow, subflow)
                     
      #           print 'rips it apart, results:', presubflow, subflow
     #            print 'sf', source.following
@@ -196,39 +225,67 @@ class FunctionFlowEmulator:
 
 class SimpleEmulator(FunctionFlowEmulator):
     """A simple class for flow detection. Compatible with ISAs with no branch delays, no predicates etc.
-    Depends on instructions with the interface of FlowInstructionMixIn."""
+    Depends on instructions with the interface of FlowInstructionMixIn, read through get_flow of the instruction list."""
     def follow_subflow(self, source, index):
     #    print 'starting emulation after {0}'.format(source)
-        current_index = index
-
-        # for instruction in self.instructions indexed by current_index:
-        for instruction in self.instructions[current_index:]:
-            if instruction.jumps():
+        for current_index in xrange(index, len(self.instructions)):
+            kind, target = self.instructions.get_flow(current_index)
+            if kind in (JUMP, CONDITIONAL_JUMP, DYNAMIC_JUMP):
    #             print 'leaving 0x{0:x} from 0x{1:x}'.format(self.instructions[current_index].address, instruction.address)
-                if not (isinstance(instruction.target, int) or isinstance(instruction.target, long)):
-                    raise EmulationUnsupported("Function can't be traced, contains a dynamic jump at 0x{0:x}.".format(instruction.address))
-                if instruction.is_conditional():
+                if kind == DYNAMIC_JUMP:
+                    raise EmulationUnsupported("Function can't be traced, contains a dynamic jump at 0x{0:x}.".format(self.instructions[current_index].address))
+                if kind == CONDITIONAL_JUMP:
                     subflow = self.commit_flow(source, index, current_index)
                     self.find_subflow(subflow, current_index + 1)
   #                  print 'again from', hex(instruction.address)
-                    self.find_subflow(subflow, self.get_index(instruction.target))
+                    self.find_subflow(subflow, self.get_index(target))
                     return
                 else:
                     subflow = self.commit_flow(source, index, current_index)
-                    self.find_subflow(subflow, self.get_index(instruction.target))
+                    self.find_subflow(subflow, self.get_index(target))
                     return
-            elif instruction.breaks_function():
+            elif kind == BREAK:
                 subflow = self.commit_flow(source, index, current_index)
                 add_edge(subflow, self._end)
  #               print subflow, 'is *FINISH*ed'
                 return
-            
             post_subflow = self.find_existing_subflow(current_index + 1)
             if post_subflow:
 #                print '*CRASH*es with', post_subflow
                 subflow = self.commit_flow(source, index, current_index)
                 add_edge(subflow, post_subflow)
                 return
-
-            current_index += 1
         raise ValueError("Emulation can't continue - the instruction stream ends unexpectedly at {0:x}.".format(self.instructions[-1].address))
+
+
+class PendingAddress:
+    """An address get_index was asked for, looked up only once it's followed."""
+    def __init__(self, address):
+        self.address = address
+
+
+class WorklistEmulatorMixIn:
+    """Replaces recursion of FunctionFlowEmulator with an explicit stack of discontinuities still to follow, so that long chains of branches don't hit the recursion limit.
+    Resulting graph is the same. Mix in before an emulator class: its follow_subflow is used unchanged, find_subflow calls only get scheduled.
+    Jump targets are looked up when their turn comes, so a target out of the code fails only after the fallthrough path is followed, like with recursion.
+    """
+    def find(self, start_index):
+        pending = [(self.flow, start_index)]
+        while pending:
+            source, index = pending.pop()
+            if isinstance(index, PendingAddress):
+                index = FunctionFlowEmulator.get_index(self, index.address)
+            self._scheduled = []
+            FunctionFlowEmulator.find_subflow(self, source, index)
+            # the first branch scheduled gets followed first, like in recursive order
+            pending.extend(reversed(self._scheduled))
+
+    def find_subflow(self, source, start_index):
+        self._scheduled.append((source, start_index))
+
+    def get_index(self, address):
+        return PendingAddress(address)
+
+
+class WorklistSimpleEmulator(WorklistEmulatorMixIn, SimpleEmulator):
+    pass
@@ -1,5 +1,7 @@
 from common.closures import *
 from common.graphs import *
+import tracing
+from exceptions import FlowDetectionError
 
 import functools
 
@@ -82,36 +84,50 @@ ordered_prev = ordered_prev_node
 
 def structurize_mess(mess, reverse_paths):
     wrapper = MessStructurizer(mess, reverse_paths)
-    wrapper.print_dot('raw_mess.dot', marked_edges=[reverse_paths])
+    wrapper.print_dot('raw_mess', marked_edges=[reverse_paths])
     wrapper.wrap_largest_bananas()
     for banana in wrapper.bananas:
         BananaStructurizer(banana).structurize()
     wrapper.merge_straightlinks()
-    wrapper.print_dot('straightlinked.dot')
+    wrapper.print_dot('straightlinked')
 
 
 class MessStructurizer:
     def __init__(self, mess_closure, reverse_edges):
         self.mess_closure = mess_closure
-        self.reverse_edges = reverse_edges
+        # edges get renamed when nodes are wrapped, keep the owner's set intact
+        self.reverse_edges = set(reverse_edges)
         self.bananas = None
+        self.dominators = None
     
     def wrap_largest_bananas(self):
         """Wraps all bananas that can be potentially found, but starts with largest. They won't be structured at first.
         """
         bananas = []
+        self.restart_search()
         while True:
             new_banana = self.find_wrap_banana()
-            print(new_banana)
+            tracing.sink.message('banana {0}', new_banana)
             if new_banana is None:
                 break
             bananas.append(new_banana)
-            self.print_dot('banana_swallowed.dot', marked_edges=    [self.reverse_edges])
+            self.print_dot('banana_swallowed', marked_edges=[self.reverse_edges])
         self.bananas = bananas
     
+    def restart_search(self):
+        """Finds all dominators anew and starts following edges from the beginning of the mess."""
+        self.dominators = EdgeDominators(self.mess_closure.begin, self.reverse_edges)
+        self.visited_edges = set()
+        self.renamed_edges = {}
+        self.pending_edges = []
+        self.enter(self.mess_closure.begin)
+
+    def enter(self, node):
+        self.pending_edges.extend(reversed([edge for edge, next in ordered_next_edge(node, self.reverse_edges)]))
+
     def find_wrap_banana(self):
         """
-        Wraps the first banana it can find. Needs to restart the search every time anew because the graph gets restructured significantly.
+        Wraps the first banana it can find. The search continues where the previous one stopped: wrapping a banana doesn't change dominators of edges outside of it, so edges already followed still don't start any.
         Follow links in "ordered" fashion - in this way find pairs of most distant edges that dominate each other and wrap them in bananas.
         This will wrap forward flows as well as reverse flows.
             Strategy for cutting off: include start node, if node does not split; include end node if node is not joined from elsewhere.
@@ -123,102 +139,37 @@ class MessStructurizer:
         
         FIXME: strategy for reducing shortlinks
         """
-        def follow_func(stack):
-            return ordered_next(stack[-1], self.reverse_edges)
-        
-        def follow_edge_func(last):
-            return ordered_next_edge(last, self.reverse_edges)
-
-        def follow_rev(stack):
-            return ordered_prev(stack[-1], self.reverse_edges)
-
         # XXX: exclude self from pre-dominators
         # XXX: self-loops?
 
         # find all pre-dominators and post-dominators
         # XXX: they should be found according to normal flow direction... or something, to reduce simple >A->B< links
         
-        def follow_link_iter(stack):
-            edge, node = stack[-1]
-            return ordered_next_link(node, self.reverse_edges)
-            
-        def follow_rev_link_iter(stack):
-            edge, node = stack[-1]
-            return ordered_prev_link(node, self.reverse_edges)
-                
-        edges_to_predoms = {}
-        edges_to_postdoms = {}
-        for edge in iteredges(self.mess_closure.begin):
-            if edge in self.reverse_edges:
-                last, first = edge
-            else:
-                first, last = edge
-                
-            edges_to_postdoms[edge] = find_ordered_dominator_edges(last, follow_link_iter)
-            edges_to_predoms[edge] = find_ordered_dominator_edges(first, follow_rev_link_iter)
-            
-        def get_both_dominator(edge):
-            """Returns the farthest edge which dominates edge if it is dominated by edge.
-            """
-            edge_dominators = edges_to_postdoms[edge]
-            # if edge has no post-dominators then it is its own dominator and only node dominated by itself
-            if not edge_dominators:
-                return edge
-            
-            # start searching from the fathest one
-            for postdom in reversed(edge_dominators):
-                # if is dominated by edge, then we found it
-                if edge in edges_to_predoms[postdom]:
-                    return postdom
-            
-            # if no dominator of edge is also dominated by edge, then edge is the only such dominator
-            return edge
-            
-        def wrap(start, end):
-            """Wraps nodes (and whatever is between them) together in a future banana. Rewires accordingly,
-            """
-     #       FCUK: update reverse edges after each rewiring
-            print('Farthest node that is predomed by {0} is {1}, need to wrap'.format(start, end))
-            mess = wrap_between(start, end, self.reverse_edges)
-            # sinle entry and single exit guaranteed
-            if not mess.begin == start:
-                raise Exception("Something went wrong.")
-            if not mess.end == end:
-                raise Exception("Something went wrong.")
-            
-            for preceding in start.preceding[:]:
-                if preceding not in mess.closures:
-                    preceding.replace_following(start, mess)
-            
-            for following in end.following[:]:
-                if following not in mess.closures:
-                    following.replace_preceding(end, mess)
-            self.mess_closure.replace_closures(mess.closures, mess)
-            print("wrapped {0} inside {1}".format(mess, self.mess_closure))
-            return mess
-            
-        print("reverse", self.reverse_edges)
-        print("begin", self.mess_closure.begin)
-        print("predoms", edges_to_predoms)
-        print("postdoms", edges_to_postdoms)
+        tracing.sink.message('reverse {0}', self.reverse_edges)
+        tracing.sink.message('begin {0}', self.mess_closure.begin)
         
-        for edge in iteredges(self.mess_closure.begin,
-                              follow_func=follow_edge_func):
-            print("E", edge)
+        while self.pending_edges:
+            edge = self.pending_edges.pop()
+            while edge in self.renamed_edges:
+                edge = self.renamed_edges[edge]
+            if edge in self.visited_edges or not self.dominators.contains(edge):
+                continue
+            self.visited_edges.add(edge)
+            tracing.sink.message('E {0}', edge)
             # find lowest edge for which top is dominator
-            both_dominator = get_both_dominator(edge)
-            print("BD", both_dominator)
+            both_dominator = self.dominators.get_both_dominator(edge)
+            tracing.sink.message('BD {0}', both_dominator)
 #            nodes_between = find_nodes(edge, both_dominator)
             # find all nodes in between
             # remove the top node if it splits
             # XXX: handle the top node if it joins from lower
             # similar rules for bottom
             if edge not in self.reverse_edges:
-                print("fw")
+                tracing.sink.message('fw')
                 source, target = edge
                 end_source, end_target = both_dominator
             else:
-                print("rev")
+                tracing.sink.message('rev')
                 # do the same thing, but pay attention to order
                 source, target = both_dominator
                 end_source, end_target = edge
@@ -235,14 +186,212 @@ class MessStructurizer:
             else:
                 end = end_target
             if start != end and not (end, start) == edge:
-                return wrap(start, end)
+                return self.wrap(start, end, edge)
+            self.enter(self.dominators.ordered(edge)[1])
         return None
+
+    def wrap(self, start, end, edge):
+        """Wraps nodes (and whatever is between them) together in a future banana. Rewires accordingly, and carries reverse edges and dominators over to the new node.
+        edge is the one the banana was found with.
+        """
+        tracing.sink.message('Farthest node that is predomed by {0} is {1}, need to wrap', start, end)
+        nexts = walk_between(start, end, self.reverse_edges)
+        mess = LooseMess(set(nexts), set([start]), set([end]))
+        # sinle entry and single exit guaranteed
+        if not mess.begin == start:
+            raise Exception("Something went wrong.")
+        if not mess.end == end:
+            raise Exception("Something went wrong.")
+        closures = mess.closures
+
+        internal_edges = set()
+        crossing_edges = set()
+        for node in closures:
+            for following in node.following:
+                if following in closures:
+                    internal_edges.add((node, following))
+                else:
+                    crossing_edges.add((node, following))
+            for preceding in node.preceding:
+                if preceding not in closures:
+                    crossing_edges.add((preceding, node))
+
+        renamed = {}
+        for preceding in start.preceding[:]:
+            if preceding not in closures:
+                renamed[preceding, start] = preceding, mess
+                preceding.replace_following(start, mess)
+        
+        for following in end.following[:]:
+            if following not in closures:
+                renamed[end, following] = mess, following
+                following.replace_preceding(end, mess)
+        self.mess_closure.replace_closures(closures, mess)
+        tracing.sink.message('wrapped {0} inside {1}', mess, self.mess_closure)
+
+        # dominators outside only stay the same if the ordered graph enters the mess at start and leaves it at end
+        single_entry_exit = crossing_edges == set(renamed) \
+                            and not crossing_edges & self.reverse_edges \
+                            and all(nexts[node] for node in closures if node is not end)
+
+        for old, new in renamed.items():
+            if old in self.reverse_edges:
+                self.reverse_edges.remove(old)
+                self.reverse_edges.add(new)
+        self.reverse_edges.difference_update(internal_edges)
+
+        if not single_entry_exit:
+            self.restart_search()
+            return mess
+
+        self.dominators.collapse(closures | internal_edges, mess, start, end, renamed)
+        for old, new in renamed.items():
+            if old in self.visited_edges:
+                self.visited_edges.add(new)
+        self.renamed_edges.update(renamed)
+        edge = renamed.get(edge, edge)
+        if self.dominators.contains(edge):
+            self.visited_edges.add(edge)
+            self.enter(self.dominators.ordered(edge)[1])
+        return mess
         
     def merge_straightlinks(self):
         return self.mess_closure.reduce_straightlinks()
             
-    def print_dot(self, filename, marked_edges=None, marked_nodes=None):
-        return as_dot(filename, self.mess_closure.begin, marked_nodes=marked_nodes, marked_edges=marked_edges)
+    def print_dot(self, name, marked_edges=None, marked_nodes=None):
+        if tracing.sink.enabled:
+            tracing.sink.graph(name, self.mess_closure.begin, marked_nodes=marked_nodes, marked_edges=marked_edges)
+
+
+class EdgeDominators:
+    """Pre- and post-dominator edges of all edges in an ordered graph, found in one pass.
+    Every edge is split into a node of its own, so that edges dominating it can be read off the node dominator trees of the split graph. Edges are ordered: they go from first to last node in stretched order.
+    """
+    def __init__(self, begin, reverse_edges):
+        self.reverse_edges = reverse_edges
+        nodes = list(iternodes(begin))
+
+        def follow(node):
+            if isinstance(node, tuple):
+                return [self.ordered(node)[1]]
+            return set(edge for edge, next in ordered_next_link(node, reverse_edges))
+
+        def follow_rev(node):
+            if isinstance(node, tuple):
+                return [self.ordered(node)[0]]
+            return set(edge for edge, prev in ordered_prev_link(node, reverse_edges))
+
+        post_doms, exit = find_post_dominator_tree(nodes, follow)
+        pre_doms, entry = find_post_dominator_tree(nodes, follow_rev)
+        self.post_doms = post_doms
+        self.post_children = dict((node, []) for node in post_doms)
+        for node, parent in post_doms.items():
+            if parent is not node:
+                self.post_children[parent].append(node)
+        self.pre_dom_tree = DominatorTree(pre_doms, entry)
+
+        # the chain of post-dominators of a node, reduced to edges, is walked by jumping 2**level edges at a time
+        self.next_edge = {}
+        self.lifts = {} # edge -> edges 1, 2, 4... steps farther along its chain
+        for node in reverse_postorder(exit, self.post_children.__getitem__):
+            self.find_next_edge(node)
+            if isinstance(node, tuple):
+                self.find_lifts(node)
+
+    def find_next_edge(self, node):
+        parent = self.post_doms[node]
+        if parent is node:
+            self.next_edge[node] = None
+        elif isinstance(parent, tuple):
+            self.next_edge[node] = parent
+        else:
+            self.next_edge[node] = self.next_edge[parent]
+
+    def find_lifts(self, edge):
+        """Lifts of edges farther along the chain must be known already."""
+        lifts = []
+        farther = self.next_edge[edge]
+        while farther is not None:
+            lifts.append(farther)
+            above = self.lifts[farther]
+            if len(above) < len(lifts):
+                break
+            farther = above[len(lifts) - 1]
+        self.lifts[edge] = lifts
+
+    def contains(self, edge):
+        return edge in self.post_doms
+
+    def ordered(self, edge):
+        """Returns (first, last) nodes of edge."""
+        if edge in self.reverse_edges:
+            last, first = edge
+        else:
+            first, last = edge
+        return first, last
+
+    def get_post_dominators(self, edge):
+        """Returns edges present on all paths starting at edge, from the closest one."""
+        first, last = self.ordered(edge)
+        return [dom for dom in iterdominators(self.post_doms, last) if isinstance(dom, tuple)]
+
+    def pre_dominates(self, edge, dominated):
+        """True if edge is on all paths ending at dominated."""
+        return edge != dominated and self.pre_dom_tree.dominates(edge, dominated)
+
+    def get_both_dominator(self, edge):
+        """Returns the farthest edge which dominates edge if it is dominated by edge.
+        Edges dominated by edge form the beginning of the chain of its post-dominators, so the end of that beginning is found by bisecting the chain.
+        """
+        first, last = self.ordered(edge)
+        dominator = self.next_edge.get(last)
+        # if edge has no post-dominators then it is its own dominator and only node dominated by itself
+        if dominator is None or not self.pre_dominates(edge, dominator):
+            return edge
+        for level in reversed(range(len(self.lifts[dominator]))):
+            lifts = self.lifts[dominator]
+            if level < len(lifts) and self.pre_dominates(edge, lifts[level]):
+                dominator = lifts[level]
+        return dominator
+
+    def collapse(self, nodes, mess, start, end, renamed):
+        """Replaces a region entered only at start and left only at end with mess, without finding dominators anew.
+        nodes are the nodes and edges inside the region. renamed maps edges entering and leaving the region to ones connected to mess.
+        Dominance between nodes outside doesn't change: mess takes the place of end among post-dominators, and of start among pre-dominators.
+        """
+        collapse_dominators(self.post_doms, self.post_children, nodes, mess, end)
+        self.pre_dom_tree.collapse(nodes, mess, start)
+        for node in nodes:
+            del self.next_edge[node]
+            self.lifts.pop(node, None)
+        for old, new in renamed.items():
+            rename_dominator(self.post_doms, self.post_children, old, new)
+            self.pre_dom_tree.rename(old, new)
+            del self.next_edge[old]
+            del self.lifts[old]
+
+        # only edges after mess are its post-dominators, so they go first
+        tops = [new for new in renamed.values() if new[0] is mess] + [mess]
+        renamed_edges = set(renamed.values())
+        for top in tops:
+            stack = [top]
+            while stack:
+                node = stack.pop()
+                self.find_next_edge(node)
+                if node is top or node in renamed_edges or not isinstance(node, tuple):
+                    stack.extend(self.post_children[node])
+
+        # chains of everything after mess got shorter, lifts are found again from the top down
+        refreshed = set()
+        stack = tops[::-1]
+        while stack:
+            node = stack.pop()
+            if node in refreshed:
+                continue
+            refreshed.add(node)
+            if isinstance(node, tuple):
+                self.find_lifts(node)
+            stack.extend(self.post_children[node])
 
 
 class BaseBananaStructurizer:
@@ -280,7 +429,7 @@ class BaseBananaStructurizer:
             if dom is None:
                 raise ValueError("Post-dominator not found for {0}".format(current))
             subgraph = self.wrap_sub(current, dom)
-            print("Creating {0} in banana {1}".format(subgraph, self))
+            tracing.sink.message('Creating {0} in banana {1}', subgraph, self)
             # rewire
 
             # Assumption: going only forward in respect to flow (only works inside bananas)
@@ -314,18 +463,24 @@ class BaseBananaStructurizer:
             if self.graph_head in subgraph.closures:
                 self.graph_head = subgraph
 
-            print('sub', subgraph)
-            print('begin', subgraph.begin, subgraph.begin.preceding, subgraph.begin.following)
-            print('end', subgraph.end, subgraph.end.preceding, subgraph.end.following)
+            if tracing.sink.enabled:
+                tracing.sink.message('sub {0}', subgraph)
+                tracing.sink.message('begin {0} {1} {2}', subgraph.begin, subgraph.begin.preceding, subgraph.begin.following)
+                tracing.sink.message('end {0} {1} {2}', subgraph.end, subgraph.end.preceding, subgraph.end.following)
             
             self.subs.append(subgraph)
-            self.print_dot('dropped_{0}.dot'.format(len(self.subs)))
+            self.print_dot('dropped')
             current = dom
             
     def pack_banana(self):
         current = self.graph_head
         closures = []
+        seen = set()
         while True:
+            if current in seen:
+                # the chain came back onto itself instead of reaching the end
+                raise FlowDetectionError("Flow loops without reaching the end at {0}.".format(current))
+            seen.add(current)
             closures.append(current)
             following_count = len(current.following)
             if following_count == 1:
@@ -346,12 +501,14 @@ class BaseBananaStructurizer:
     def wrap_sub(self, start, end):
         return find_mess(start, end, self.reverse_edges)
 
-    def print_dot(self, filename):
+    def print_dot(self, name):
+        if not tracing.sink.enabled:
+            return
         if self.reverse_edges is None:
             marked_edges = []
         else:
             marked_edges = [self.reverse_edges]
-        as_dot(filename, self.graph_head, marked_edges=marked_edges)
+        tracing.sink.graph(name, self.graph_head, marked_edges=marked_edges)
         
 
 class BananaStructurizer(BaseBananaStructurizer):
@@ -367,6 +524,43 @@ class BananaStructurizer(BaseBananaStructurizer):
         return sub
         
 
+class GhostClosure(NodeClosure):
+    """Empty node placed before a node that both joins and splits flow. Defined at module level so that functions referring to it can be pickled."""
+    __slots__ = ('original',)
+
+    def __init__(self, original):
+        Closure.__init__(self, None)
+        self.preceding = original.preceding[:]
+        self.following = original.following[:]
+        # XXX: this is so ugly I want to cry
+        import flow.emulator
+        self.node = flow.emulator.Subflow(flow.emulator.Instructions([], original.node.instructions.start_index, original.node.instructions.end_index))
+        self.original = original
+    
+    def insert(self):
+        """Inserts ghost before its original"""
+        original = self.original
+        self.following = [original]
+        original.preceding = [self]
+        for preceding in self.preceding:
+            preceding.following.remove(original)
+            preceding.following.append(self)
+    
+    def remove(self):
+        """Removes self from before original"""
+        original = self.original
+        original.preceding = self.preceding
+        for preceding in self.preceding:
+            preceding.following.remove(self)
+            preceding.following.append(original)
+        # seppuku now
+    
+    def __str__(self):
+        return 'G({0})'.format(self.original)
+     
+    __repr__ = __str__
+
+
 class GraphWrapper(BaseBananaStructurizer): # necessarily a bananawrapper
     def __init__(self, graph_head):
         self.cfg_head = graph_head
@@ -379,39 +573,6 @@ class GraphWrapper(BaseBananaStructurizer): # necessarily a bananawrapper
         """Creates ghost nodes before any node with more than 1 preceding and following, in order to allow dominator algorithms to see the links between a node start (joins) and end.
         """
         # XXX: should be a filtering stateless call, not a method
-        class GhostClosure(NodeClosure):
-            def __init__(self, original):
-                Closure.__init__(self, None)
-                self.preceding = original.preceding[:]
-                self.following = original.following[:]
-                # XXX: this is so ugly I want to cry
-                import flow.emulator
-                self.node = flow.emulator.Subflow(flow.emulator.Instructions([], original.node.instructions.start_index, original.node.instructions.end_index))
-                self.original = original
-            
-            def insert(self):
-                """Inserts ghost before its original"""
-                original = self.original
-                self.following = [original]
-                original.preceding = [self]
-                for preceding in self.preceding:
-                    preceding.following.remove(original)
-                    preceding.following.append(self)
-            
-            def remove(self):
-                """Removes self from before original"""
-                original = self.original
-                original.preceding = self.preceding
-                for preceding in self.preceding:
-                    preceding.following.remove(self)
-                    preceding.following.append(original)
-                # seppuku now
-            
-            def __str__(self):
-                return 'G({0})'.format(self.original)
-             
-            __repr__ = __str__
-        
         multijoiners = set()
         for node in iternodes(self.graph_head):
             if len(node.preceding) > 1 and len(node.following) > 1:
@@ -447,35 +608,48 @@ class GraphWrapper(BaseBananaStructurizer): # necessarily a bananawrapper
         
         
 def find_reverse_edges(graph_head, graph_tail):
+    """Depth-first walk visiting every node once. An edge is reverse if it leads back onto the current path.
+    After all following edges of a node turn out reverse, edges leading into it are reverse too: the one it was reached with, and any later ones arriving at the finished node.
+    """
     reverse_edges = set()
+    on_path = set()
+    finished = set()
+    reversed_nodes = set()
     
-    def follow_func(stack):
-        top = stack[-1]
-        for next in top.following:
-            if not (top, next) in reverse_edges:
-                yield next
-    
-    for path, forward in iterpaths(graph_head,
-                                   follow_func=follow_func,
-                                   partial=True,
-                                   on_backwards=True):
-                          
-        top = path[-1]
-        if forward:
-            # when moving into depth, check paths along the way to stop before traversing them
-            for next in top.following:
-                if next in path:
-                    reverse_edges.add((top, next))
+    def enter(node):
+        on_path.add(node)
+        # when moving into depth, check paths along the way to stop before traversing them
+        for next in node.following:
+            if next in on_path:
+                reverse_edges.add((node, next))
+        return node, iter(node.following)
+
+    stack = [enter(graph_head)]
+    while stack:
+        top, nexts = stack[-1]
+        for next in nexts:
+            if (top, next) in reverse_edges:
+                continue
+            if next in reversed_nodes:
+                reverse_edges.add((top, next))
+            elif next not in finished:
+                stack.append(enter(next))
+                break
         else:
+            stack.pop()
+            on_path.remove(top)
+            finished.add(top)
             # when coming back after traversing all child nodes, check the kind of an edge
             # if all following edges are reverse direction, then this one is also.
             if top.following and \
                top is not graph_tail and \
                all(((top, next) in reverse_edges) for next in top.following):
-                # top node MUST have a parent, since there must be a split to reverse mode before it
-                # XXX: I really hope that's true
-                top_parent = path[-2]
-                reverse_edges.add((top_parent, top))
+                reversed_nodes.add(top)
+                # top node must have a parent, since there must be a split to reverse mode before it
+                if not stack:
+                    # even the head only leads back: the function loops forever without reaching its end
+                    raise FlowDetectionError("Function never reaches its end, all paths from its start lead into loops.")
+                reverse_edges.add((stack[-1][0], top))
     return reverse_edges
 
 
@@ -501,57 +675,61 @@ def find_latest_post_dominator(node, follow_func):
 
 
 def find_unordered_dominators(node, follow_func):
-    doms = None
-    for path in iterpaths(node, follow_func=follow_func):
-        if doms is None:
-            doms = set(path[1:]) # remove self
-        else:
-            doms.intersection_update(path)
-    return doms
+    return set(find_post_dominators(node, follow_func))
 
 
 def find_unordered_dominator_edges(node, follow_iter):
-    doms = None
-    for path in iteredgepaths(node, follow_iter=follow_iter):
-        edges = path.get_edges()
-        if doms is None:
-            doms = set(edges)
-        else:
-            doms.intersection_update(edges)
-    return doms
+    return set(find_ordered_dominator_edges(node, follow_iter))
 
 
 def find_ordered_dominator_edges(node, follow_iter):
-    doms = find_unordered_dominator_edges(node, follow_iter)
-    path = iteredgepaths(node, follow_iter=follow_iter).next()
-
-    return list(filter(doms.__contains__, path.get_edges()))
+    """Returns edges present on all paths starting at node, in order.
+    An edge lies on all paths only if it starts in a node lying on all paths, and is the only edge going out of it.
+    """
+    links = {}
+    def follow(n):
+        links[n] = list(follow_iter([(None, n)]))
+        return [next for edge, next in links[n]]
+
+    post_doms, exit = find_post_dominator_tree([node], follow)
+    edges = []
+    for dom in [node] + list(iterdominators(post_doms, node)):
+        out_edges = set(edge for edge, next in links[dom])
+        if len(out_edges) == 1:
+            edges.append(out_edges.pop())
+    return edges
 
 
 def find_post_dominators(node, follow_func):
-    doms = find_unordered_dominators(node, follow_func)
-    path = iterpaths(node, follow_func=follow_func).next()
-
-    dom_list = []
-    for child in path:
-        if child in doms:
-            dom_list.append(child)
-    return dom_list
-    
-def wrap_between(start, end, reverse_edges):
-    print 'wrap', start, end
-    def follow_func(stack):
-        if stack[-1] is end:
-            return ()
+    """Returns nodes present on all paths starting at node, in order, excluding node."""
+    post_doms, exit = find_post_dominator_tree([node], lambda n: follow_func([n]))
+    return list(iterdominators(post_doms, node))
+
+
+def walk_between(start, end, reverse_edges):
+    """Visits every node on ordered paths from start, stopping at end, once. Paths are never enumerated.
+    Returns a dict mapping visited nodes to their next nodes. Nodes ending paths have none.
+    """
+    nexts = {}
+    stack = [start]
+    while stack:
+        node = stack.pop()
+        if node is end:
+            nexts[node] = []
         else:
-            return ordered_next(stack[-1], reverse_edges)
-
-    contents = set()
-    for path in iterpaths(start, follow_func=follow_func):
-        print path
-        if len(path) < 2:
-            raise Exception
-        contents.update(set(path))
+            nexts[node] = list(ordered_next(node, reverse_edges))
+        for next in nexts[node]:
+            if next not in nexts:
+                nexts[next] = None
+                stack.append(next)
+    if not nexts[start]:
+        raise Exception("Not sure why. The shortest flow should have separate start and end nodes.")
+    return nexts
+
+
+def wrap_between(start, end, reverse_edges):
+    tracing.sink.message('wrap {0} {1}', start, end)
+    contents = set(walk_between(start, end, reverse_edges))
     return LooseMess(contents, set([start]), set([end]))
 
 
@@ -559,53 +737,55 @@ def find_mess(start, end, reverse_edges):
     #TODO: cut start/end connections
     # determine if starts with split or looplike join
     # XXX: make sure outer loop layers are peeled if joins from nested loops
-    start_index = None
-    if not any((preceding, start) in reverse_edges for preceding in start.preceding): # if not loop-join
-        start_index = 1
+    cut_start = not any((preceding, start) in reverse_edges for preceding in start.preceding) # if not loop-join
     
     # determine if end is a join or a looplike split
-    end_index = None
-    if not any((end, following) in reverse_edges for following in end.following): # not loop-split
-        end_index = -1    
+    cut_end = not any((end, following) in reverse_edges for following in end.following) # not loop-split
         
-    # find all nodes in between
-    
-    def follow_func(stack):
-        if stack[-1] is end:
-            return ()
-        else:
-            return ordered_next(stack[-1], reverse_edges)
+    # find all nodes in between, as if every path was cut at the start and end
+    nexts = walk_between(start, end, reverse_edges)
+    path_ends = set(node for node, following in nexts.items() if not following)
     
-    contents = set()
+    contents = set(nexts)
+    if cut_start:
+        contents.discard(start)
+    if cut_end:
+        contents.difference_update(path_ends)
+
+    # paths going straight from start to an end become empty after cutting
     start_nodes = set()
+    if cut_start:
+        for next in nexts[start]:
+            if cut_end and next in path_ends:
+                start_nodes.add(None)
+            else:
+                start_nodes.add(next)
+    else:
+        start_nodes.add(start)
+
     end_nodes = set()
-    for path in iterpaths(start, follow_func=follow_func):
-        if len(path) < 2:
-            raise Exception("Not sure why. The shortest flow should have separate start and end nodes.")
-            
-        path = path[start_index:end_index]
-        if len(path):
-            snode = path[0]
-            enode = path[-1]
-        else:
-            snode = None
-            enode = None
-            
-        start_nodes.add(snode)
-        end_nodes.add(enode)
-        contents.update(set(path))
-    print('mess contents', contents)
+    for node, following in nexts.items():
+        for next in following:
+            if next in path_ends:
+                if not cut_end:
+                    end_nodes.add(next)
+                elif cut_start and node is start:
+                    end_nodes.add(None)
+                else:
+                    end_nodes.add(node)
+    tracing.sink.message('mess contents {0}', contents)
     return LooseMess(contents, start_nodes, end_nodes)
 
     
 def structurize(graph_head):
-    as_dot('unstructured.dot', graph_head)
+    if tracing.sink.enabled:
+        tracing.sink.graph('unstructured', graph_head)
     graphmaker = GraphWrapper(graph_head)
-    graphmaker.print_dot('unstructured_wrapped.dot')
+    graphmaker.print_dot('unstructured_wrapped')
     graphmaker.mark_reverse_edges()
-    graphmaker.print_dot('reverse.dot')
+    graphmaker.print_dot('reverse')
     graphmaker.structurize()
     graphmaker.split()
-    graphmaker.print_dot('split.dot')
+    graphmaker.print_dot('split')
     graphmaker.pack_banana()
     return graphmaker.banana
@@ -0,0 +1,184 @@
+"""Summaries of functions, as seen by their callers.
+
+A summary tells which registers a function reads before writing them, which registers it may write, which memory it loads and stores and whether it returns. Calls to a summarized function are then taken as writing only the registers in its summary, without looking into the function again: see flow.dataflow.ReachingDefinitions and operations.RegisterValues.
+Memory locations are (base, offset, size). base is the name of a register, standing for the value it has when the function starts, or None for absolute addresses. At a call, locations of the called function are put in terms of the caller's entry.
+Summaries are found bottom-up: calls to functions without a summary yet, e.g. in recursion, may do anything.
+"""
+
+import cache
+import operations
+from values import CONSTANTS
+from common.graphs import iternodes
+from common.instructions import classify, CALL, DYNAMIC_CALL
+import emulator
+from dataflow import ReachingDefinitions, ENTRY
+from calls import CallGraph
+
+
+class FunctionSummary:
+    def __init__(self, read, written, loads, stores, returns):
+        self.read = read # frozenset of registers read before being written, None if not known
+        self.written = written # frozenset of registers that may be written, None if not known
+        self.loads = loads # frozenset of locations loaded, including called functions, None if not known
+        self.stores = stores # frozenset of locations stored, including called functions, None if not known
+        self.returns = returns
+
+    def as_tuple(self):
+        """Returns the summary as sorted tuples, for writing it out and hashing."""
+        def sort(items):
+            if items is None:
+                return None
+            return tuple(sorted(items))
+        return sort(self.read), sort(self.written), sort(self.loads), sort(self.stores), self.returns
+
+    @staticmethod
+    def from_tuple(summary):
+        def unsort(items):
+            if items is None:
+                return None
+            return frozenset(items)
+        read, written, loads, stores, returns = summary
+        return FunctionSummary(unsort(read), unsort(written), unsort(loads), unsort(stores), returns)
+
+    def __str__(self):
+        def show(items, show_item=str):
+            if items is None:
+                return '?'
+            return ' '.join(show_item(item) for item in sorted(items))
+        return 'reads {0}; writes {1}; loads {2}; stores {3}{4}'.format(show(self.read), show(self.written), show(self.loads, show_location), show(self.stores, show_location),
+                                                                      '' if self.returns else '; never returns')
+
+
+def show_location(location):
+    base, offset, size = location
+    if base is None:
+        return 'b{0}[0x{1:x}]'.format(size * 8, offset)
+    return 'b{0}[{1}+0x{2:x}]'.format(size * 8, base, offset)
+
+
+# functions called without a summary may do anything
+UNKNOWN_CALL = FunctionSummary(None, None, None, None, True)
+
+ENTRY_ONLY = frozenset([ENTRY])
+
+
+class UntrackedMemory:
+    """Memory without known contents, so that summaries depend on nothing but the function."""
+    def get_memory(self, base, offset, size):
+        return None
+
+
+class Locator:
+    """Puts memory accessed by instructions of a function in terms of the function's entry."""
+    def __init__(self, definitions, register_values):
+        self.definitions = definitions
+        self.register_values = register_values
+
+    def find_location(self, subflow, index, base, offset, size):
+        """Returns the location of memory at register base + offset, as seen before instruction index of subflow. base None is an absolute address, offset may be a register. None if it's not known."""
+        if not isinstance(offset, CONSTANTS):
+            offset = self.register_values.get(subflow, index, offset)
+            if not isinstance(offset, CONSTANTS):
+                return None
+        if base is None:
+            return None, offset, size
+        if self.definitions.get_definitions(subflow, index, base) == ENTRY_ONLY:
+            return base, offset, size
+        base = self.register_values.get(subflow, index, base)
+        if isinstance(base, CONSTANTS):
+            return None, base + offset, size
+        return None
+
+    def translate(self, subflow, index, locations):
+        """Returns locations of the function called by instruction index of subflow, in terms of this function. None if any isn't known."""
+        if locations is None:
+            return None
+        translated = set()
+        for base, offset, size in locations:
+            location = self.find_location(subflow, index, base, offset, size)
+            if location is None:
+                return None
+            translated.add(location)
+        return translated
+
+
+def summarize(flat_graph, summaries):
+    """Returns the FunctionSummary of the function in flat_graph. summaries: address -> FunctionSummary of functions it calls."""
+    definitions = ReachingDefinitions(flat_graph, summaries)
+    locator = Locator(definitions, operations.RegisterValues(definitions, UntrackedMemory(), summaries))
+    read = set()
+    written = set()
+    loads = set()
+    stores = set()
+    returns = False
+
+    def add(locations, added):
+        """added: locations, None if not known. Any location not known makes all of them unknown."""
+        if locations is None or added is None or None in added:
+            return None
+        locations.update(added)
+        return locations
+
+    for node in iternodes(flat_graph):
+        if isinstance(node, emulator.EndNode):
+            returns = True
+        if not hasattr(node, 'instructions'):
+            continue
+        for i, instruction in enumerate(node.instructions.instructions):
+            kind, target = classify(instruction)
+            if kind in (CALL, DYNAMIC_CALL):
+                summary = summaries.get(target, UNKNOWN_CALL)
+                instruction_read, instruction_written = summary.read, summary.written
+                loads = add(loads, locator.translate(node, i, summary.loads))
+                stores = add(stores, locator.translate(node, i, summary.stores))
+            else:
+                try:
+                    instruction_read, instruction_written = instruction.find_regs()
+                except NotImplementedError:
+                    # may as well touch any memory
+                    instruction_read = instruction_written = loads = stores = None
+                if instruction.loads_memory():
+                    loads = add(loads, [locator.find_location(node, i, instruction.base, instruction.offset, instruction.size)])
+                if instruction.stores_memory():
+                    stores = add(stores, [locator.find_location(node, i, instruction.base, instruction.offset, instruction.size)])
+
+            if instruction_read is None:
+                read = None
+            elif read is not None:
+                for reg in instruction_read:
+                    if ENTRY in definitions.get_definitions(node, i, reg):
+                        read.add(reg)
+            if instruction_written is None:
+                written = None
+            elif written is not None:
+                written.update(instruction_written)
+
+    def freeze(items):
+        if items is None:
+            return None
+        return frozenset(items)
+    return FunctionSummary(freeze(read), freeze(written), freeze(loads), freeze(stores), returns)
+
+
+def summarize_functions(flat_graphs, arch_name, cache_dir=None):
+    """Returns address -> FunctionSummary of functions in flat_graphs (start address -> flat flow graph), found bottom-up in their call graph.
+    cache_dir: directory keeping summaries found before, reused while the function and summaries of functions it calls stay the same.
+    """
+    call_graph = CallGraph(flat_graphs)
+    summaries = {}
+    for address in call_graph.iter_bottom_up():
+        flat_graph = flat_graphs[address]
+        callee_summaries = dict((callee, summaries[callee]) for callee in call_graph.callees[address] if callee in summaries)
+        if cache_dir is None:
+            summaries[address] = summarize(flat_graph, callee_summaries)
+            continue
+        key = cache.make_summary_key(cache.make_function_key(arch_name, address, flat_graph),
+                                     dict((callee, summary.as_tuple()) for callee, summary in callee_summaries.items()))
+        summary = cache.load_summary(cache_dir, key)
+        if summary is None:
+            summary = summarize(flat_graph, callee_summaries)
+            cache.store_summary(cache_dir, key, summary.as_tuple())
+        else:
+            summary = FunctionSummary.from_tuple(summary)
+        summaries[address] = summary
+    return summaries
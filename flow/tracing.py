@@ -0,0 +1,63 @@
+"""Tracing of the flow detection steps, for debugging the structurizer. Off by default.
+
+The current sink receives messages and snapshots of graphs. NullTrace drops them without formatting anything. Callers building arguments only for the trace, like graph snapshots, check sink.enabled first. DirectoryTrace writes a subdirectory per function into a chosen directory: numbered .dot snapshots of every step and a log of messages.
+"""
+
+import os
+from common.graphs import as_dot
+
+
+class NullTrace:
+    enabled = False
+
+    def start_function(self, address):
+        pass
+
+    def message(self, text, *args):
+        """text is formatted with args only if the message is recorded."""
+        pass
+
+    def graph(self, name, graph_head, marked_nodes=None, marked_edges=None):
+        pass
+
+
+class DirectoryTrace:
+    enabled = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.function_directory = None
+        self.log = None
+        self.step = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def start_function(self, address):
+        if self.log is not None:
+            self.log.close()
+        self.function_directory = os.path.join(self.directory, '{0:x}'.format(address))
+        if not os.path.isdir(self.function_directory):
+            os.makedirs(self.function_directory)
+        self.log = open(os.path.join(self.function_directory, 'trace.log'), 'w')
+        self.step = 0
+
+    def message(self, text, *args):
+        if self.log is None:
+            self.start_function(0)
+        self.log.write(text.format(*args) + '\n')
+
+    def graph(self, name, graph_head, marked_nodes=None, marked_edges=None):
+        if self.log is None:
+            self.start_function(0)
+        self.step += 1
+        filename = os.path.join(self.function_directory, '{0:03}_{1}.dot'.format(self.step, name))
+        self.message('step {0}: {1}', self.step, filename)
+        as_dot(filename, graph_head, marked_nodes=marked_nodes, marked_edges=marked_edges)
+
+
+sink = NullTrace()
+
+
+def set_sink(new_sink):
+    global sink
+    sink = new_sink
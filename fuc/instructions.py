@@ -74,6 +74,10 @@ class BRAInstruction(FucInstruction):
     def calls_function(self):
         return False
 
+    def evaluate(self, machine_state):
+        # flags are not followed, no registers change
+        pass
+
 
 class CALLInstruction(FucInstruction):
     def __init__(self, arch, address, opcode, mnemonic, operands):
@@ -100,6 +104,9 @@ class RETInstruction(FucInstruction):
     def calls_function(self):
         return False
 
+    def evaluate(self, machine_state):
+        pass
+
 
 class LDInstruction(SimpleInstruction):
     def __init__(self, arch, address, opcode, mnemonic, operands):
@@ -115,6 +122,9 @@ class LDInstruction(SimpleInstruction):
         
         self.offset = parse_reg_or_imm(offset)
 
+    def loads_memory(self):
+        return True
+
     def evaluate(self, machine_state):
         offset = self.offset
         if not isinstance(self.offset, int):
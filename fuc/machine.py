@@ -1,28 +1,22 @@
 import memory
 import values
+import operations
+from flow.dataflow import ReachingDefinitions
+from flow.summaries import summarize_functions
 
 
-class Registers:
-    REGISTERS = ['$r' + str(num) for num in range(16)]
-    def __init__(self):
-        self.gp = [values.UnknownValue(reg_name) for reg_name in self.REGISTERS]
-    
-    def get(self, name):
-        return self.gp[int(name[2:])]
-
-    def set(self, name, value):
-        self.gp[int(name[2:])] = value
+REGISTERS = operations.RegisterLayout(['$r' + str(num) for num in range(16)])
 
 
 class MachineState:
     def __init__(self, memory_structure):
-        self.regs = Registers()
+        self.regs = operations.RegisterFile(REGISTERS)
         self.memory = memory_structure
     
     def read_memory(self, base, offset, size):
         cell = self.memory.get_memory(base, offset, size)
         if cell is None:
-            return values.MemoryRead(base, offset, size)
+            return values.get_memory_read(base, offset, size)
         return cell
 
     def write_memory(self, base, offset, size, value):
@@ -43,13 +37,13 @@ class DummyMachineState:
 
     def read_register(self, reg_spec):
         self.read_places.add(reg_spec)
-        return values.UnknownValue(None)
+        return values.get_unknown(None)
 
     def write_register(self, reg_spec, value):
         self.written_places.add(reg_spec)
 
     def read_memory(self, base, offset, size):
-        return values.UnknownValue(None)
+        return values.get_unknown(None)
 
     def write_memory(self, base, offset, size, value):
         pass
@@ -65,14 +59,19 @@ class MemoryStructure:
     def __init__(self):
         self.data_SRAM = memory.FucMemoryLayout()
         self.analyzed_operations = None
+        self.summaries = None
 
     def get_unknown_state(self, name):
         return MachineState(self.data_SRAM, name)
 
-    def analyze(self, functions):
+    def analyze(self, flat_graphs, cache_dir=None):
+        """flat_graphs: function start address -> flat flow graph
+        cache_dir: directory keeping function summaries found before
+        """
         self.analyzed_operations = []
-        for function in functions:
-            function.apply_instruction_analyzer(self.scan_instruction_block)
+        self.summaries = summarize_functions(flat_graphs, 'fuc', cache_dir)
+        for flat_graph in flat_graphs.values():
+            self.scan_function(flat_graph)
 
         memory_structure = self.data_SRAM.find_structure()
         
@@ -81,13 +80,16 @@ class MemoryStructure:
                 candidate.mark_complete()
         return memory_structure
     
-    def scan_instruction_block(self, instructions):
+    def scan_function(self, flat_graph):
         """This function sucks. should be split into finding memory layout and then finding roles, naming structures and whatnot.
         """
+        definitions = ReachingDefinitions(flat_graph, self.summaries)
+        register_values = operations.RegisterValues(definitions, self.data_SRAM, self.summaries)
         write_candidates = []
-        for i, instruction in enumerate(instructions):
-            if instruction.mnemonic == 'st':
-                write_candidates.append(operations.MemoryAssignment(instructions, self.data_SRAM, i))
+        for subflow in definitions.blocks:
+            for i, instruction in enumerate(subflow.instructions.instructions):
+                if instruction.mnemonic == 'st':
+                    write_candidates.append(operations.MemoryAssignment(register_values, subflow, i, self.data_SRAM))
         
         for candidate in write_candidates:
             candidate.traceback()
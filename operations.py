@@ -1,36 +1,172 @@
+import warnings
 import values
+from common.instructions import classify, CALL, DYNAMIC_CALL
+from flow.dataflow import ENTRY, find_call_summary
+
+
+class BlockTransfer:
+    """What a subflow does to registers, evaluated once: the values instructions write, as expressions of values at the beginning of their run.
+    A run is a stretch of instructions that can be evaluated. It starts at the beginning of the subflow or after an instruction that can't be evaluated. In expressions, UnknownValues of registers stand for registers at the beginning of the run, and MemoryReads for memory.
+    Calls to functions with a summary don't end the run: registers the function may write get CallResults, the others keep their values.
+    """
+    def __init__(self, subflow, memory, summaries=None):
+        """summaries: address -> flow.summaries.FunctionSummary of called functions"""
+        self.written = [] # per instruction: register -> value written, None if the instruction can't be evaluated
+        self.starts = [] # per instruction: index where its run starts
+        self.arch = None
+        state = None
+        for i, instruction in enumerate(subflow.instructions.instructions):
+            self.arch = instruction.arch
+            if state is None:
+                state = instruction.arch.MachineState(memory)
+                start = i
+            written = self.evaluate(instruction, state, summaries)
+            if written is None:
+                state = None
+            self.written.append(written)
+            self.starts.append(start)
+
+    @staticmethod
+    def evaluate(instruction, state, summaries):
+        """Returns register -> value written by instruction, evaluated on state, or None if it can't be evaluated."""
+        summary = find_call_summary(instruction, summaries)
+        summarized = summary is not None and summary.written is not None
+        if summarized:
+            read, registers = frozenset(), summary.written
+        else:
+            try:
+                read, registers = instruction.find_regs()
+            except NotImplementedError:
+                return None
+        # e.g. special registers aren't tracked
+        if not all(reg in state.regs.layout for reg in read | registers):
+            return None
+        if summarized:
+            for reg in registers:
+                state.write_register(reg, values.get_call_result(reg, classify(instruction)[1], instruction.address))
+        else:
+            instruction.evaluate(state)
+        return dict((reg, state.read_register(reg)) for reg in registers)
 
-def traceback_register(context, reg_spec):
-    instructions, index, memory = context
-    index = index - 1 
-    while index >= 0:
-        try:
-            instruction = instructions[index]
-            if reg_spec in instruction.get_modified_regs():
-                return instruction.get_result_value((instructions, index, memory), reg_spec)
 
-            index -= 1
-        except NotImplementedError:
-            print instruction.mnemonic, 'is not supported yet'
+class RegisterValues:
+    """Values of registers as instructions of one function see them.
+    Subflows are evaluated once into BlockTransfers. Values are followed into other subflows through reaching definitions of registers, and put in place of registers in the transfers' expressions.
+    """
+    def __init__(self, definitions, memory, summaries=None):
+        """definitions: flow.dataflow.ReachingDefinitions of the function, found with the same summaries
+        summaries: address -> flow.summaries.FunctionSummary of called functions
+        """
+        self.definitions = definitions
+        self.memory = memory
+        self.summaries = summaries
+        self.transfers = {} # subflow -> BlockTransfer
+        self.known = {} # (subflow, index, reg_spec) of the defining instruction -> value
+        self.joined = {} # (subflow, index, reg_spec) of the reading instruction -> value where several definitions meet
+        self.substituted = {} # (subflow, start of run) -> {expression: value}
+
+    def get_transfer(self, subflow):
+        transfer = self.transfers.get(subflow)
+        if transfer is None:
+            transfer = self.transfers[subflow] = BlockTransfer(subflow, self.memory, self.summaries)
+        return transfer
+
+    def get(self, subflow, index, reg_spec):
+        """Returns the value of reg_spec just before instruction index of subflow."""
+        definitions = self.definitions.get_definitions(subflow, index, reg_spec)
+        if definitions == frozenset([ENTRY]):
+            # the value the function was called with
+            return values.get_unknown(reg_spec)
+        if len(definitions) != 1:
+            # unknown, and not necessarily the value from function entry either
+            key = (subflow, index, reg_spec)
+            if key not in self.joined:
+                self.joined[key] = values.UnknownValue(reg_spec)
+            return self.joined[key]
+        definition, = definitions
+        key = definition + (reg_spec,)
+        if key not in self.known:
+            # registers defined through themselves in a loop end up unknown instead of recursing forever
+            self.known[key] = values.UnknownValue(reg_spec)
+            self.known[key] = self.get_written(definition, reg_spec)
+        return self.known[key]
+
+    def get_written(self, definition, reg_spec):
+        subflow, index = definition
+        transfer = self.get_transfer(subflow)
+        written = transfer.written[index]
+        if written is None or reg_spec not in written:
+            instruction = subflow.instructions.instructions[index]
+            # calls write what the called function does, not known here
+            if classify(instruction)[0] not in (CALL, DYNAMIC_CALL):
+                warnings.warn('{0} is not supported yet'.format(instruction.mnemonic))
             return values.UnknownValue(reg_spec)
-    return values.UnknownValue(reg_spec)
+        return self.substitute(subflow, transfer.starts[index], written[reg_spec])
 
+    def substitute(self, subflow, start, value):
+        """Puts values before instruction start of subflow in place of registers in value."""
+        if isinstance(value, values.CONSTANTS):
+            return value
+        done = self.substituted.setdefault((subflow, start), {})
+        if value not in done:
+            if isinstance(value, values.UnknownValue):
+                result = self.get(subflow, start, value.name)
+            elif isinstance(value, values.BitwiseAndResult):
+                result = values.get_and(self.substitute(subflow, start, value.v1), self.substitute(subflow, start, value.v2))
+            elif isinstance(value, values.BitwiseOrResult):
+                result = values.get_or(self.substitute(subflow, start, value.v1), self.substitute(subflow, start, value.v2))
+            elif isinstance(value, values.MemoryRead):
+                state = self.get_transfer(subflow).arch.MachineState(self.memory)
+                result = state.read_memory(self.substitute(subflow, start, value.base), self.substitute(subflow, start, value.offset), value.size)
+            else:
+                result = value
+            done[value] = result
+        return done[value]
+
+
+class RegisterLayout:
+    """Register names of an architecture, numbered once."""
+    def __init__(self, names):
+        self.slots = dict((name, slot) for slot, name in enumerate(names))
+        self.unknown = tuple(values.get_unknown(name) for name in names)
+
+    def __contains__(self, name):
+        return name in self.slots
+
+
+class RegisterFile:
+    """Registers of a machine state. Registers not written hold their shared unknown value.
+    Written values are shared with copies until either side writes again, so copying and evaluating cost as much as the registers changed.
+    """
+    def __init__(self, layout, changed=None):
+        self.layout = layout
+        self.shared = changed is not None
+        self.changed = {} if changed is None else changed # slot -> value
 
-class Registers:
-    REGISTERS = ['$r' + str(num) for num in range(16)]
-    def __init__(self):
-        self.gp = [values.UnknownValue(reg_name) for reg_name in self.REGISTERS]
-    
     def get(self, name):
-        return self.gp[int(name[2:])]
+        """Raises KeyError for names that are not registers of layout."""
+        slot = self.layout.slots[name]
+        try:
+            return self.changed[slot]
+        except KeyError:
+            return self.layout.unknown[slot]
 
     def set(self, name, value):
-        self.gp[int(name[2:])] = value
+        slot = self.layout.slots[name]
+        if self.shared:
+            self.changed = dict(self.changed)
+            self.shared = False
+        self.changed[slot] = value
+
+    def copy(self):
+        self.shared = True
+        return RegisterFile(self.layout, self.changed)
 
 
 class MemoryAssignment:
-    def __init__(self, instructions, data_SRAM, store_index):
-        self.instruction = instructions[store_index]
+    def __init__(self, register_values, subflow, store_index, data_SRAM):
+        self.instruction = subflow.instructions.instructions[store_index]
+        self.subflow = subflow
         self.index = store_index
         
         self.base = self.instruction.base
@@ -39,7 +175,7 @@ class MemoryAssignment:
         self.value = self.instruction.source
         self.memory = None
 
-        self.instructions = instructions
+        self.register_values = register_values
         self.affected_instructions = []
         self.data_SRAM = data_SRAM
 
@@ -53,14 +189,14 @@ class MemoryAssignment:
         return self.instruction.size
     
     def traceback(self):
-        self.base = traceback_register((self.instructions, self.index, self.data_SRAM), self.instruction.base)
+        self.base = self.register_values.get(self.subflow, self.index, self.instruction.base)
 
         if not isinstance(self.instruction.offset, int):
-            self.offset = traceback_register((self.instructions, self.index, self.data_SRAM), self.instruction.offset)
+            self.offset = self.register_values.get(self.subflow, self.index, self.instruction.offset)
         
         size = self.get_memory_size()
         self.memory = self.data_SRAM.get_memory(self.base, self.offset, size)
-        self.value = traceback_register((self.instructions, self.index, self.data_SRAM), self.instruction.source)
+        self.value = self.register_values.get(self.subflow, self.index, self.instruction.source)
     
     def __str__(self):
         value = self.value
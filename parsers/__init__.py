@@ -5,39 +5,58 @@ import re
 
 class objdump:
     function_header = re.compile('^(?P<address>[a-f0-9]*) ' + re.escape('<') + '(?P<name>.+)' + re.escape('>: ') + '*$')
+    # address, tab, opcode bytes, then tab, mnemonic and operands without tabs, unless opcode continues from the previous line
+    instruction_line = re.compile(r'([^:\t]*):\t([0-9a-f]{2}(?: [0-9a-f]{2})*) *(?:\t(\S+)(?: +(\S(?:[^\t]*\S)?))?)?\s*$')
     """Compatible with -Mintel"""
     
+    @classmethod
+    def parse_deasm_line(cls, arch, line):
+        """Returns the instruction or FunctionHeader in line, or None."""
+        line = line.strip('\n')
+        if line:
+            if line.lstrip() != line:
+                return cls.parse_instruction(arch, line)
+            header = cls.parse_functions_cmap(line)
+            if header:
+                return FunctionHeader(*header)
+            # some comment...
+        return None
+
+    @classmethod
+    def iter_deasm(cls, arch, lines):
+        """Yields instructions and FunctionHeaders as lines come."""
+        return iter_items(cls.parse_deasm_line, arch, lines)
+
     @classmethod
     def parse_deasm(cls, arch, lines):
-        instructions = []
-        function_mapping = {}
-        
-        for line in lines:
-            line = line.strip('\n')
-            if line:
-                if line.lstrip() != line:
-                    instructions.append(cls.parse_instruction(arch, line))
-                elif re.match(cls.function_header, line):
-                    addr, name = cls.parse_functions_cmap(line)
-                    if addr in function_mapping:
-                        raise ValueError('Function at 0x{0:x} with name {0} already defined as {1}'.format(addr, function_mapping[addr], name))
-                    function_mapping[addr] = name
-                else:
-                    # some comment...
-                    pass
-        return instructions, function_mapping
+        return collect_deasm(arch, cls.iter_deasm(arch, lines))
     
     @classmethod
     def parse_instructions(cls, arch, lines):
         # TODO: deprecated, deasm file will contain more than instructions
         return cls.parse_deasm(arch, lines)[0]
 
-    @staticmethod
-    def parse_instruction(arch, disasmline):
+    @classmethod
+    def parse_instruction(cls, arch, disasmline):
         """Format:
         1234:   56 78 90      mnemonic dest,src
         addr:   op co de      mnemonic destination,source
+        Usual lines are split by instruction_line in one go, others take the longer way.
         """
+        match = cls.instruction_line.match(disasmline)
+        if match is None:
+            return cls.parse_unusual_instruction(arch, disasmline)
+        addr, str_opcode, mnemonic, operands = match.groups()
+        if mnemonic is None:
+            mnemonic = ''
+        if operands is None:
+            operands = []
+        else:
+            operands = operands.split(',')
+        return arch.Instruction(addr, tuple(bytearray.fromhex(str_opcode)), mnemonic, operands)
+
+    @staticmethod
+    def parse_unusual_instruction(arch, disasmline):
         addr, rest = disasmline.split(':', 1)
         try:
             ret = rest.strip().replace('\t', '  ').split("  ", 1)
@@ -49,7 +68,7 @@ class objdump:
             raise ParsingError("line {0!r} invalid".format(repr(disasmline)))
         
         try:
-            opcode = tuple(int(charpair[0], 16) * 16 + int(charpair[1], 16) for charpair in str_opcode.strip().split())
+            opcode = tuple(bytearray.fromhex(str_opcode.strip()))
         except ValueError, e:
             raise ParsingError("opcode {0!r} invalid".format(str_opcode))
         
@@ -66,7 +85,7 @@ class objdump:
         
     @classmethod
     def parse_functions_cmap(cls, cmapline):
-        matches = re.match(cls.function_header, cmapline)
+        matches = cls.function_header.match(cmapline)
         if matches:
             addr, name = matches.groupdict()['address'], matches.groupdict()['name']
             return int(addr, 16), name
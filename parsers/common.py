@@ -1,15 +1,67 @@
+from __future__ import absolute_import
+
+import sys
+from common.instructions import InstructionStore
+
+
 class ParsingError(ValueError): pass
 
 
-def parse_instructions(parser, arch, lines):
-    # filter out instructions and parse them
-    instructions = []
+class FunctionHeader:
+    """Names the function at address, as found among instructions in deasm."""
+    def __init__(self, address, name):
+        self.address = address
+        self.name = name
+
+
+def open_deasm(path):
+    """Opens path for reading line by line. '-' is standard input."""
+    if path == '-':
+        return sys.stdin
+    return open(path)
+
+
+def parse_instruction_line(parse_line, arch, line):
+    """Returns the instruction parse_line finds in line, or None for comments and lines that are not instructions."""
+    line = line.strip()
+    if not line.startswith('//') and not line == '' and not line.startswith('['):
+        try:
+            return parse_line(arch, line)
+        except ParsingError, e:
+            #print e, 'line skipped'
+            pass
+    return None
+
+
+def iter_items(parse_deasm_line, arch, lines):
+    """Yields what parse_deasm_line finds in lines as they come."""
     for line in lines:
-        line = line.strip()
-        if not line.startswith('//') and not line == '' and not line.startswith('['):
-            try:
-                instructions.append(parser.parse_line(arch, line))
-            except ParsingError, e:
-                #print e, 'line skipped'
-                pass
-    return instructions
+        item = parse_deasm_line(arch, line)
+        if item is not None:
+            yield item
+
+
+def iter_instructions(parse_line, arch, lines):
+    """Yields instructions parsed by parse_line as lines come, skipping comments and lines that are not instructions."""
+    for line in lines:
+        instruction = parse_instruction_line(parse_line, arch, line)
+        if instruction is not None:
+            yield instruction
+
+
+def collect_deasm(arch, items):
+    """Gathers instructions and FunctionHeaders from items into (InstructionStore, function mapping)."""
+    instructions = InstructionStore(arch.Instruction)
+    function_mapping = {}
+    for item in items:
+        if isinstance(item, FunctionHeader):
+            if item.address in function_mapping:
+                raise ValueError('Function at 0x{0:x} with name {1} already defined as {2}'.format(item.address, item.name, function_mapping[item.address]))
+            function_mapping[item.address] = item.name
+        else:
+            instructions.append(item)
+    return instructions, function_mapping
+
+
+def parse_instructions(parser, arch, lines):
+    return collect_deasm(arch, iter_instructions(parser.parse_line, arch, lines))[0]
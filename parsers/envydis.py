@@ -1,4 +1,27 @@
-from parser.common import *
+import string
+from parsers.common import ParsingError, parse_instruction_line, iter_items, collect_deasm
+
+
+def parse_deasm_line(arch, line):
+    """Returns the instruction in line, or None. envydis output names no functions, they come from a cmap file."""
+    return parse_instruction_line(parse_line, arch, line)
+
+
+def iter_deasm(arch, lines):
+    """Yields instructions as lines come."""
+    return iter_items(parse_deasm_line, arch, lines)
+
+
+def parse_deasm(arch, lines):
+    return collect_deasm(arch, iter_deasm(arch, lines))
+
+
+def parse_instructions(arch, lines):
+    return parse_deasm(arch, lines)[0]
+
+
+# flags are uppercase, instructions lowercase
+FLAGS = string.ascii_uppercase
 
 
 def parse_line(arch, disasmline):
@@ -14,19 +37,11 @@ def parse_line(arch, disasmline):
         raise ParsingError("line {0} invalid".format(repr(disasmline)))
     
     # make opcode a X-int tuple, to be similar to py3k bytes
-    opcode.strip()
     if len(opcode) % 2:
         opcode = '0' + opcode
+    opcode = tuple(bytearray.fromhex(opcode))
     
-    opcode = tuple((int(first, 16) * 16 + int(second, 16) for first, second in zip(opcode[::2], opcode[1::2])))
-    
-    # destroy flags, stupid way:
-    flags = 'ABCDEFGHIJKLMNOPQRSTUWVXYZ'
-    
-    instruction = rest
-    for flag in flags:
-        instruction = instruction.replace(flag, '')
-    spl = instruction.strip().split()
+    spl = rest.translate(None, FLAGS).split()
     mnemonic = spl[0]
     operands = spl[1:]
     return arch.Instruction(addr, opcode, mnemonic, operands)
@@ -0,0 +1,102 @@
+"""Sidecar index of deasm files, so that looking at a few functions of a huge dump doesn't parse all of it.
+
+The index holds the address and byte offset of every instruction line, in file order. It's built once with a full pass of the parser and written next to the deasm file, as <deasm>.index. It's used as long as the deasm file keeps its size and modification time and is read with the same parser.
+With the index, instructions are parsed only when flow detection reaches them, from lines read through mmap. Finding blocks of the whole program or autodetecting functions would parse everything anyway, so this is only for runs with functions given by hand.
+"""
+
+from __future__ import absolute_import
+
+import os
+import mmap
+import marshal
+from array import array
+import cache
+from common.instructions import classify, AddressLookupMixIn
+from parsers.common import FunctionHeader
+
+
+INDEX_VERSION = 1
+
+
+def get_index_path(path):
+    return os.path.abspath(path) + '.index'
+
+
+def get_signature(parser, path):
+    stat = os.stat(path)
+    return INDEX_VERSION, parser.__name__, stat.st_size, stat.st_mtime
+
+
+def load_index(parser, path):
+    """Returns (addresses, offsets, ascending), or None if there's no index matching the file at path."""
+    try:
+        with open(get_index_path(path), 'rb') as index:
+            signature, addresses, offsets, ascending = marshal.load(index)
+    except (IOError, EOFError, ValueError, TypeError):
+        return None
+    if signature != get_signature(parser, path):
+        return None
+    return array('L', addresses), array('L', offsets), ascending
+
+
+def build_index(parser, arch, path):
+    """Parses the whole file at path and writes its index. Returns the same as load_index."""
+    signature = get_signature(parser, path)
+    addresses = array('L')
+    offsets = array('L')
+    offset = 0
+    with open(path, 'rb') as deasm:
+        for line in deasm:
+            item = parser.parse_deasm_line(arch, line)
+            if item is not None and not isinstance(item, FunctionHeader):
+                addresses.append(item.address)
+                offsets.append(offset)
+            offset += len(line)
+    ascending = all(addresses[i] < addresses[i + 1] for i in xrange(len(addresses) - 1))
+    try:
+        cache.write_entry(get_index_path(path), marshal.dumps((signature, addresses.tostring(), offsets.tostring(), ascending)))
+    except (IOError, OSError):
+        # no place for the index next to deasm, it gets built again next time
+        pass
+    return addresses, offsets, ascending
+
+
+def open_indexed(parser, arch, path):
+    """Returns LazyInstructions of the deasm file at path, building the index if there's none yet."""
+    index = load_index(parser, path)
+    if index is None:
+        index = build_index(parser, arch, path)
+    return LazyInstructions(parser, arch, path, *index)
+
+
+class LazyInstructions(AddressLookupMixIn):
+    """Instructions of an indexed deasm file, parsed on first use. Looks up addresses and flow like common.instructions.InstructionStore."""
+    def __init__(self, parser, arch, path, addresses, offsets, ascending):
+        self.parser = parser
+        self.arch = arch
+        self.addresses = addresses
+        self.offsets = offsets
+        self.data = ''
+        if addresses:
+            with open(path, 'rb') as deasm:
+                self.data = mmap.mmap(deasm.fileno(), 0, access=mmap.ACCESS_READ)
+        self.instances = {}
+        self.address_index = None
+        if not ascending:
+            self.build_address_index()
+
+    def get_flow(self, index):
+        return classify(self[index])
+
+    def get_mnemonic(self, index):
+        return self[index].mnemonic
+
+    def get_instruction(self, index):
+        instruction = self.instances.get(index)
+        if instruction is None:
+            start = self.offsets[index]
+            end = self.data.find('\n', start)
+            if end == -1:
+                end = len(self.data)
+            instruction = self.instances[index] = self.parser.parse_deasm_line(self.arch, self.data[start:end])
+        return instruction
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""Measures throughput of the deasm parsers on generated files.
+usage: parse_benchmark.py [number of lines, 1000000 by default]
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import arches.x86_64
+import fuc
+import parsers
+import parsers.envydis
+
+
+def write_objdump(path, count, rng):
+    with open(path, 'w') as deasm:
+        deasm.write('\nprogram:     file format elf64-x86-64\n\n\nDisassembly of section .text:\n')
+        address = 0x400000
+        for i in xrange(count):
+            if i % 1000 == 0:
+                deasm.write('\n{0:016x} <f{1}>:\n'.format(address, i))
+            choice = rng.random()
+            if choice < 0.5:
+                opcode, text = '48 89 e5', 'mov    rbp,rsp'
+            elif choice < 0.7:
+                opcode, text = '48 8b 05 cd 6f 52 00', 'mov    rax,QWORD PTR [rip+0x526fcd]        # 945fd8 <g@Base>'
+            elif choice < 0.85:
+                opcode, text = '75 0a', 'jne    {0:x} <f+0x10>'.format(address + 12)
+            elif choice < 0.95:
+                opcode, text = 'e8 00 00 00 00', 'call   {0:x} <g>'.format(address + 5)
+            else:
+                opcode, text = 'c3', 'ret    '
+            deasm.write('  {0:x}:\t{1:<21}\t{2}\n'.format(address, opcode + ' ', text))
+            address += len(opcode.split())
+
+
+def write_envydis(path, count, rng):
+    with open(path, 'w') as deasm:
+        for i in xrange(count):
+            address = i * 4
+            if i % 1000 == 0:
+                deasm.write('// function {0}\n'.format(i))
+            choice = rng.random()
+            if choice < 0.5:
+                opcode, text = 'f4000102', 'B  mov $r0 $r1'
+            elif choice < 0.75:
+                opcode, text = '3c2203', '   add b32 $r2 $r3 0x4'
+            elif choice < 0.9:
+                opcode, text = 'f40c0300', '   bra 0x{0:x}'.format(address + 8)
+            elif choice < 0.97:
+                opcode, text = 'f4210000', 'C  call 0x{0:x}'.format(address + 4)
+            else:
+                opcode, text = 'f8', '   ret'
+            deasm.write('{0:08x}: {1:<10}{2}\n'.format(address, opcode, text))
+
+
+def measure(name, parse, arch, path, count):
+    with open(path) as deasm:
+        start = time.time()
+        instructions, function_mapping = parse(arch, deasm)
+        elapsed = time.time() - start
+    print '{0}: {1} instructions in {2:.2f}s, {3:.0f} lines/s'.format(name, len(instructions), elapsed, count / elapsed)
+
+
+count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+directory = tempfile.mkdtemp()
+try:
+    rng = random.Random(0)
+    path = os.path.join(directory, 'objdump.deasm')
+    write_objdump(path, count, rng)
+    measure('objdump', parsers.objdump.parse_deasm, arches.x86_64, path, count)
+    path = os.path.join(directory, 'envydis.deasm')
+    write_envydis(path, count, rng)
+    measure('envydis', parsers.envydis.parse_deasm, fuc, path, count)
+finally:
+    shutil.rmtree(directory)
@@ -0,0 +1,30 @@
+"""Basic blocks of the whole program, compared with flow found by emulating each function."""
+
+import unittest
+import fuc
+from flow.exceptions import FlowDetectionError
+from test_emulator import PROGRAM, parse, describe
+
+
+class BlockTableTest(unittest.TestCase):
+    def test_same_as_emulation(self):
+        instructions = parse(PROGRAM)
+        table = fuc.find_blocks(instructions)
+        for address in (0, 0x15):
+            self.assertEqual(describe(table.function_flow(address)), describe(fuc.detect_flow(instructions, address)))
+
+    def test_blocks(self):
+        table = fuc.find_blocks(parse(PROGRAM))
+        self.assertEqual(table.starts, [0, 1, 2, 4, 6, 7])
+        self.assertEqual(table.find_block(0).successors, [1])
+        self.assertEqual(table.find_block(1).successors, [2, 4])
+        self.assertTrue(table.find_block(6).returns)
+
+    def test_empty_program(self):
+        table = fuc.find_blocks([])
+        self.assertEqual(table.starts, [])
+        self.assertRaises(FlowDetectionError, table.function_flow, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+import fuc
+import flow
+import cache
+import display
+from common.instructions import InstructionStore
+from flow.summaries import FunctionSummary
+from test_emulator import PROGRAM, parse
+
+
+IF_PROGRAM = '''\
+00000000: 00 mov $r1 0x10
+00000003: 00 bra ne 0xc
+00000006: 00 mov $r2 0x1
+00000009: 00 call 0x15
+0000000c: 00 ret
+00000015: 00 ret
+'''
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as deasm:
+            deasm.write(text)
+        return path
+
+
+class ParseCacheTest(CacheTest):
+    def test_key(self):
+        path = self.write('a.asm', PROGRAM)
+        self.assertEqual(cache.make_key('fuc', path), cache.make_key('fuc', self.write('b.asm', PROGRAM)))
+        self.assertNotEqual(cache.make_key('fuc', path), cache.make_key('xtensa', path))
+        self.assertNotEqual(cache.make_key('fuc', path), cache.make_key('fuc', self.write('c.asm', PROGRAM + PROGRAM)))
+        # contents of separate files don't run together
+        self.assertNotEqual(cache.make_key('fuc', path, self.write('empty', '')), cache.make_key('fuc', self.write('empty', ''), path))
+
+    def test_round_trip(self):
+        instructions = InstructionStore(fuc.Instruction)
+        for instruction in parse(PROGRAM):
+            instructions.append(instruction)
+        key = cache.make_key('fuc', self.write('a.asm', PROGRAM))
+        self.assertEqual(cache.load(self.directory, key, fuc), None)
+        cache.store(self.directory, key, instructions, {0x15: 'f'})
+        loaded, loaded_mapping = cache.load(self.directory, key, fuc)
+        self.assertEqual([str(instruction) for instruction in loaded], [str(instruction) for instruction in instructions])
+        self.assertEqual(loaded.get_index(0x15), 7)
+        self.assertEqual(loaded_mapping, {0x15: 'f'})
+
+    def test_empty(self):
+        cache.store(self.directory, 'empty', InstructionStore(fuc.Instruction), {})
+        loaded, loaded_mapping = cache.load(self.directory, 'empty', fuc)
+        self.assertEqual(list(loaded), [])
+
+    def test_broken_entry(self):
+        with open(cache.get_path(self.directory, 'broken'), 'wb') as entry:
+            entry.write('not marshal')
+        self.assertEqual(cache.load(self.directory, 'broken', fuc), None)
+
+
+class FunctionCacheTest(CacheTest):
+    def test_key(self):
+        instructions = parse(PROGRAM)
+        key = cache.make_function_key('fuc', 0x15, fuc.detect_flow(instructions, 0x15))
+        self.assertEqual(key, cache.make_function_key('fuc', 0x15, fuc.detect_flow(parse(PROGRAM), 0x15)))
+        self.assertNotEqual(key, cache.make_function_key('fuc', 0x15, fuc.detect_flow(parse(PROGRAM.replace('$r4 0x3', '$r4 0x4')), 0x15)))
+        self.assertNotEqual(key, cache.make_function_key('fuc', 0, fuc.detect_flow(instructions, 0)))
+
+    def test_round_trip(self):
+        function = flow.detect_function(fuc, parse(IF_PROGRAM), 0)
+        key = cache.make_function_key('fuc', 0, fuc.detect_flow(parse(IF_PROGRAM), 0))
+        self.assertEqual(cache.load_function(self.directory, key), None)
+        cache.store_function(self.directory, key, function)
+        loaded = display.function_into_code(cache.load_function(self.directory, key), {0: 'f'})
+        # start points of unknown flows come in hashing order
+        self.assertEqual(sorted(loaded.split()), sorted(display.function_into_code(function, {0: 'f'}).split()))
+
+
+class SummaryCacheTest(CacheTest):
+    def test_key(self):
+        summary = FunctionSummary(frozenset(['$r1']), frozenset(['$r2']), frozenset(), frozenset([(None, 0x10, 4)]), True)
+        key = cache.make_summary_key('function', {0x15: summary.as_tuple()})
+        self.assertNotEqual(key, cache.make_summary_key('function', {}))
+        self.assertNotEqual(key, cache.make_summary_key('other function', {0x15: summary.as_tuple()}))
+        changed = FunctionSummary(summary.read, frozenset(['$r2', '$r3']), summary.loads, summary.stores, True)
+        self.assertNotEqual(key, cache.make_summary_key('function', {0x15: changed.as_tuple()}))
+
+    def test_round_trip(self):
+        summary = FunctionSummary(frozenset(['$r1']), None, frozenset([('$r1', 4, 4)]), frozenset([(None, 0x10, 4)]), False)
+        self.assertEqual(cache.load_summary(self.directory, 'key'), None)
+        cache.store_summary(self.directory, 'key', summary.as_tuple())
+        self.assertEqual(str(FunctionSummary.from_tuple(cache.load_summary(self.directory, 'key'))), str(summary))
+
+if __name__ == '__main__':
+    unittest.main()
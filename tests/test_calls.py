@@ -0,0 +1,24 @@
+import unittest
+import fuc
+from flow.calls import CallGraph, BottomUpSchedule
+from test_emulator import PROGRAM, parse
+
+
+class CallGraphTest(unittest.TestCase):
+    def setUp(self):
+        instructions = parse(PROGRAM)
+        self.call_graph = CallGraph(dict((address, fuc.detect_flow(instructions, address)) for address in (0, 0x15)))
+
+    def test_bottom_up(self):
+        self.assertEqual(self.call_graph.callees, {0: [0x15], 0x15: []})
+        self.assertEqual(list(self.call_graph.iter_bottom_up()), [0x15, 0])
+
+    def test_schedule(self):
+        schedule = BottomUpSchedule(self.call_graph)
+        self.assertEqual(schedule.start(), [0x15])
+        self.assertEqual(schedule.finish(0x15), [0])
+        self.assertEqual(schedule.finish(0), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import warnings
+import fuc
+import values
+import operations
+from common.graphs import iternodes
+from flow.dataflow import ReachingDefinitions, ENTRY
+from test_emulator import parse
+
+
+PROGRAM = '''\
+00000000: 00 mov $r1 0x12
+00000003: 00 sethi $r2 0x10000
+00000006: 00 bra ne 0x12
+00000009: 00 mov $r1 0x5
+0000000c: 00 ld b32 $r3 [$r1+0x4]
+0000000f: 00 mov $r4 $r3
+00000012: 00 and $r5 $r1 0xff
+00000015: 00 add $r6 $r6 $r6
+00000018: 00 mov $r7 $r2
+0000001b: 00 ret
+'''
+
+
+class Memory:
+    """Holds 0x77 at 9, nothing else is known."""
+    def get_memory(self, base, offset, size):
+        if isinstance(base, (int, long)) and base + offset == 9:
+            return 0x77
+        return None
+
+
+def find_position(head, address):
+    """Returns (subflow, index) of the instruction at address."""
+    for node in iternodes(head):
+        if hasattr(node, 'instructions'):
+            for i, instruction in enumerate(node.instructions.instructions):
+                if instruction.address == address:
+                    return node, i
+    raise KeyError(address)
+
+
+class ReachingDefinitionsTest(unittest.TestCase):
+    def setUp(self):
+        self.head = fuc.detect_flow(parse(PROGRAM), 0)
+        self.definitions = ReachingDefinitions(self.head)
+
+    def get(self, address, register):
+        return self.definitions.get_definitions(*(find_position(self.head, address) + (register,)))
+
+    def test_same_subflow(self):
+        self.assertEqual(self.get(6, '$r1'), frozenset([find_position(self.head, 0)]))
+        self.assertEqual(self.get(0xc, '$r1'), frozenset([find_position(self.head, 9)]))
+
+    def test_join(self):
+        self.assertEqual(self.get(0x12, '$r1'), frozenset([find_position(self.head, 0), find_position(self.head, 9)]))
+        self.assertEqual(self.get(0x12, '$r4'), frozenset([ENTRY, find_position(self.head, 0xf)]))
+        self.assertEqual(self.definitions.get_single_definition(*(find_position(self.head, 0x12) + ('$r4',))), None)
+
+    def test_join_with_entry(self):
+        head = fuc.detect_flow(parse('''\
+00000000: 00 mov $r2 $r1
+00000003: 00 bra ne 0xc
+00000006: 00 mov $r1 0x5
+00000009: 00 bra 0xf
+0000000c: 00 mov $r1 0x6
+0000000f: 00 and $r3 $r1 $r2
+00000012: 00 ret
+'''), 0)
+        register_values = operations.RegisterValues(ReachingDefinitions(head), Memory())
+        value = register_values.get(*(find_position(head, 0x12) + ('$r3',)))
+        # $r1 is 5 or 6 there, $r2 holds $r1 from entry
+        self.assertTrue(isinstance(value, values.BitwiseAndResult))
+        self.assertTrue(value.v2 is values.get_unknown('$r1'))
+        self.assertFalse(value.v1 is values.get_unknown('$r1'))
+
+    def test_entry(self):
+        self.assertEqual(self.get(0, '$r2'), frozenset([ENTRY]))
+        self.assertEqual(self.get(0x12, '$r6'), frozenset([ENTRY]))
+
+    def test_unsupported_writes_everything(self):
+        add = find_position(self.head, 0x15)
+        self.assertTrue(self.definitions.writes_everything(*add))
+        self.assertFalse(self.definitions.writes_everything(*find_position(self.head, 0x18)))
+        self.assertEqual(self.get(0x18, '$r2'), frozenset([add]))
+        self.assertEqual(self.get(0x1b, '$r7'), frozenset([find_position(self.head, 0x18)]))
+
+
+class RegisterValuesTest(unittest.TestCase):
+    def setUp(self):
+        self.head = fuc.detect_flow(parse(PROGRAM), 0)
+        self.register_values = operations.RegisterValues(ReachingDefinitions(self.head), Memory())
+
+    def get(self, address, register):
+        return self.register_values.get(*(find_position(self.head, address) + (register,)))
+
+    def test_constants(self):
+        self.assertEqual(self.get(6, '$r1'), 0x12)
+        self.assertEqual(self.get(0xc, '$r1'), 5)
+
+    def test_expressions(self):
+        value = self.get(0x12, '$r2')
+        self.assertTrue(isinstance(value, values.BitwiseOrResult))
+        self.assertEqual(value.v2, 0x10000)
+        self.assertTrue(isinstance(value.v1, values.BitwiseAndResult))
+        self.assertEqual((str(value.v1.v1), value.v1.v2), ('$r2', 0xffff))
+
+    def test_join(self):
+        """Where definitions meet, the value is unknown, but not the one from function entry."""
+        joined = self.get(0x12, '$r1')
+        self.assertTrue(isinstance(joined, values.UnknownValue))
+        self.assertTrue(self.get(0x12, '$r1') is joined)
+        self.assertFalse(self.get(0, '$r1') is joined)
+        self.assertFalse(self.get(0x15, '$r1') is joined)
+        self.assertFalse(joined is values.get_unknown('$r1'))
+
+    def test_entry(self):
+        self.assertTrue(self.get(0x12, '$r6') is values.get_unknown('$r6'))
+
+    def test_memory(self):
+        self.assertEqual(self.get(0xf, '$r3'), 0x77)
+        self.assertTrue(isinstance(self.get(0x12, '$r4'), values.UnknownValue))
+
+    def test_memory_not_known(self):
+        class UnknownMemory:
+            def get_memory(self, base, offset, size):
+                return None
+        register_values = operations.RegisterValues(ReachingDefinitions(self.head), UnknownMemory())
+        self.assertEqual(str(register_values.get(*(find_position(self.head, 0xf) + ('$r3',)))), '(b32)D[5+4]')
+
+    def test_unsupported(self):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            value = self.get(0x1b, '$r7')
+        self.assertTrue(isinstance(value, values.UnknownValue))
+        # written by add, not the value from function entry
+        self.assertFalse(value is values.get_unknown('$r2'))
+        self.assertEqual([str(warning.message) for warning in caught], ['add is not supported yet'])
+
+    def test_transfer_runs(self):
+        """Instructions that can't be evaluated split subflows into runs."""
+        subflow, index = find_position(self.head, 0x15)
+        transfer = self.register_values.get_transfer(subflow)
+        self.assertEqual(transfer.written[index], None)
+        self.assertEqual(transfer.starts[index + 1], index + 1)
+        self.assertEqual(transfer.written[index + 1], {'$r7': values.get_unknown('$r2')})
+
+    def test_untracked_register(self):
+        """$sp is not in the register file, so mov from it can't be evaluated."""
+        head = fuc.detect_flow(parse('00000000: 00 mov $r1 $sp\n00000003: 00 mov $r2 $r1\n00000006: 00 ret'), 0)
+        subflow, index = find_position(head, 0)
+        transfer = operations.RegisterValues(ReachingDefinitions(head), Memory()).get_transfer(subflow)
+        self.assertEqual(transfer.written[index], None)
+        self.assertEqual(transfer.written[index + 1], {'$r2': values.get_unknown('$r1')})
+
+if __name__ == '__main__':
+    unittest.main()
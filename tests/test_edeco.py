@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+import vp1
+import fuc
+import edeco
+import multiprocessing
+import flow.calls
+from test_emulator import PROGRAM, VP1_PROGRAM, parse
+import test_summaries
+
+
+class FindFunctionsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check(self, arch, program, addresses):
+        instructions = parse(program, arch)
+        runs = [edeco.find_functions(arch, instructions, addresses),
+                edeco.find_functions(arch, instructions, addresses, cache_dir=self.directory),
+                edeco.find_functions(arch, instructions, addresses, cache_dir=self.directory),
+                edeco.find_functions(arch, instructions, addresses, jobs=2)]
+        for functions in runs:
+            self.assertEqual([function.address for function in functions], sorted(addresses))
+
+    def test_vp1(self):
+        self.check(vp1, VP1_PROGRAM, [0])
+
+    def test_fuc(self):
+        self.check(fuc, PROGRAM, [0x15, 0])
+
+    def test_summaries_cached(self):
+        self.check(fuc, test_summaries.PROGRAM, [0, 0x12, 0x20])
+        self.assertEqual(len([name for name in os.listdir(self.directory) if name.endswith('.summary')]), 3)
+
+
+
+class PoolTest(unittest.TestCase):
+    def test_worker_exits(self):
+        """Workers that exit right away never send anything back."""
+        instructions = parse(PROGRAM)
+        call_graph = flow.calls.CallGraph({0: fuc.detect_flow(instructions, 0)})
+        pool = multiprocessing.Pool(1, os._exit, (1,))
+        try:
+            self.assertRaises(RuntimeError, edeco.find_functions_in_pool, pool, call_graph)
+        finally:
+            pool.terminate()
+
+if __name__ == '__main__':
+    unittest.main()
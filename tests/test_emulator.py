@@ -0,0 +1,102 @@
+import sys
+import unittest
+import fuc
+import vp1
+import vp1.vp1_flow
+import flow.emulator
+from flow.exceptions import FunctionBoundsException
+from common.graphs import iternodes
+
+
+PROGRAM = '''\
+00000000: 00 mov $r1 0x10
+00000003: 00 bra ne 0xc
+00000006: 00 mov $r2 0x1
+00000009: 00 call 0x15
+0000000c: 00 mov $r3 0x2
+0000000f: 00 bra ne 0x3
+00000012: 00 ret
+00000015: 00 mov $r4 0x3
+00000018: 00 ret
+'''
+
+VP1_PROGRAM = '''\
+00000000: 80 vadd $v1 $v2
+00000001: e0 bra $c0 0x5
+00000002: 80 vadd $v1 $v2
+00000003: 80 vadd $v1 $v2
+00000004: e0 bra $c1 0x1
+00000005: 80 vadd $v1 $v2
+00000006: e0 exit
+'''
+
+
+def parse(text, arch=fuc):
+    """text: one instruction per line, as 'address: opcode mnemonic operands', address and opcode in hex."""
+    instructions = []
+    for line in text.strip().splitlines():
+        address, rest = line.split(':', 1)
+        words = rest.split()
+        instructions.append(arch.Instruction(address, tuple(bytearray.fromhex(words[0])), words[1], words[2:]))
+    return instructions
+
+
+def describe(flat_graph):
+    """Returns edges of flat_graph as address ranges, comparable between graphs."""
+    def name(node):
+        if not hasattr(node, 'instructions'):
+            return str(node)
+        instructions = node.instructions.instructions
+        return '{0:x}-{1:x}'.format(instructions[0].address, instructions[-1].address)
+    return sorted((name(node), name(following)) for node in iternodes(flat_graph) for following in node.following)
+
+
+def make_chain(count):
+    """count conditional branches in a row, all to the same return."""
+    lines = ['{0:08x}: 00 bra ne 0x{1:x}'.format(i * 3, count * 3) for i in range(count)]
+    lines.append('{0:08x}: 00 ret'.format(count * 3))
+    return '\n'.join(lines)
+
+
+class WorklistEmulatorTest(unittest.TestCase):
+    def test_same_as_recursive(self):
+        instructions = parse(PROGRAM)
+        for address in (0, 0x15):
+            self.assertEqual(describe(flow.emulator.WorklistSimpleEmulator(instructions, address).flow),
+                             describe(flow.emulator.SimpleEmulator(instructions, address).flow))
+
+    def test_delay_slots(self):
+        instructions = parse(VP1_PROGRAM, vp1)
+        self.assertEqual(describe(vp1.vp1_flow.WorklistEmulator(instructions, 0).flow),
+                         describe(vp1.vp1_flow.Emulator(instructions, 0).flow))
+
+    def test_long_chain(self):
+        """Deeper than the recursion limit."""
+        count = sys.getrecursionlimit() * 5
+        head = flow.emulator.WorklistSimpleEmulator(parse(make_chain(count)), 0).flow
+        seen = set([head])
+        pending = [head]
+        while pending:
+            for node in pending.pop().following:
+                if node not in seen:
+                    seen.add(node)
+                    pending.append(node)
+        self.assertEqual(len([node for node in seen if hasattr(node, 'instructions')]), count + 1)
+
+    def test_target_out_of_code(self):
+        self.assertRaises(FunctionBoundsException, flow.emulator.WorklistSimpleEmulator, parse('00000000: 00 bra ne 0x100\n00000003: 00 ret'), 0)
+
+    def test_fallthrough_fails_first(self):
+        """The fallthrough path runs out of instructions before the jump target is looked up."""
+        instructions = parse('00000000: 00 bra ne 0x100\n00000003: 00 mov $r1 0x1')
+        for emulator in (flow.emulator.SimpleEmulator, flow.emulator.WorklistSimpleEmulator):
+            try:
+                emulator(instructions, 0)
+            except ValueError as e:
+                self.assertFalse(isinstance(e, FunctionBoundsException), emulator)
+            else:
+                self.fail(emulator)
+
+
+if __name__ == '__main__':
+    unittest.main()
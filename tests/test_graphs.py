@@ -0,0 +1,147 @@
+import unittest
+from common.graphs import find_immediate_dominators, find_post_dominator_tree, find_strongly_connected, iterdominators, DominatorTree, VirtualExit
+from flow.structurizer import EdgeDominators
+
+
+class Node:
+    def __init__(self, name):
+        self.name = name
+        self.following = []
+        self.preceding = []
+
+    def __repr__(self):
+        return self.name
+
+
+def make_graph(edges):
+    """edges: 'a-b b-c'. Returns name -> Node."""
+    nodes = {}
+    for edge in edges.split():
+        first, last = [nodes.setdefault(name, Node(name)) for name in edge.split('-')]
+        first.following.append(last)
+        last.preceding.append(first)
+    return nodes
+
+
+def successors(edges):
+    """edges: 'a-b b-c'. Returns name -> names of next nodes."""
+    graph = {}
+    for edge in edges.split():
+        first, last = edge.split('-')
+        graph.setdefault(first, []).append(last)
+        graph.setdefault(last, [])
+    return graph
+
+
+def predecessors(graph):
+    reverse = dict((node, []) for node in graph)
+    for node, nexts in graph.items():
+        for next in nexts:
+            reverse[next].append(node)
+    return reverse
+
+
+DIAMONDS = 'a-b a-c b-d c-d d-e d-f e-g f-g'
+
+
+class DominatorsTest(unittest.TestCase):
+    def test_diamonds(self):
+        graph = successors(DIAMONDS)
+        idom = find_immediate_dominators('a', graph.__getitem__, predecessors(graph).__getitem__)
+        self.assertEqual(idom, {'a': 'a', 'b': 'a', 'c': 'a', 'd': 'a', 'e': 'd', 'f': 'd', 'g': 'd'})
+        self.assertEqual(list(iterdominators(idom, 'g')), ['d'])
+
+    def test_loop(self):
+        graph = successors('a-b b-c c-b c-d')
+        idom = find_immediate_dominators('a', graph.__getitem__, predecessors(graph).__getitem__)
+        self.assertEqual(idom, {'a': 'a', 'b': 'a', 'c': 'b', 'd': 'c'})
+
+    def test_unreachable_left_out(self):
+        graph = successors('a-b c-b')
+        idom = find_immediate_dominators('a', graph.__getitem__, predecessors(graph).__getitem__)
+        self.assertEqual(idom, {'a': 'a', 'b': 'a'})
+
+    def test_post_dominators(self):
+        graph = successors(DIAMONDS + ' b-h')
+        ipdom, exit = find_post_dominator_tree(['a'], graph.__getitem__)
+        self.assertTrue(isinstance(exit, VirtualExit))
+        # h ends paths too, so a and b have only the virtual exit after them
+        self.assertEqual(ipdom, {exit: exit, 'a': exit, 'b': exit, 'h': exit, 'c': 'd', 'd': 'g', 'e': 'g', 'f': 'g', 'g': exit})
+
+    def test_many_diamonds(self):
+        # paths double with every diamond
+        edges = ' '.join('{0}-{0}l {0}-{0}r {0}l-{1} {0}r-{1}'.format(i, i + 1) for i in range(200))
+        graph = successors(edges)
+        idom = find_immediate_dominators('0', graph.__getitem__, predecessors(graph).__getitem__)
+        self.assertEqual(idom['200'], '199')
+        self.assertEqual(idom['199l'], '199')
+
+
+class DominatorTreeTest(unittest.TestCase):
+    def make_tree(self):
+        graph = successors(DIAMONDS)
+        return DominatorTree(find_immediate_dominators('a', graph.__getitem__, predecessors(graph).__getitem__), 'a')
+
+    def test_dominates(self):
+        tree = self.make_tree()
+        self.assertTrue(tree.dominates('a', 'g'))
+        self.assertTrue(tree.dominates('d', 'e'))
+        self.assertTrue(tree.dominates('e', 'e'))
+        self.assertFalse(tree.dominates('b', 'd'))
+        self.assertFalse(tree.dominates('e', 'g'))
+        self.assertFalse(tree.dominates('a', 'x'))
+        self.assertEqual(list(tree.iterdominators('g')), ['d'])
+
+    def test_collapse(self):
+        tree = self.make_tree()
+        # d, e, f and g become a single node
+        tree.collapse(set('defg'), 'm', 'd')
+        self.assertEqual(tree.idom['m'], 'a')
+        self.assertTrue(tree.dominates('a', 'm'))
+        self.assertFalse(tree.dominates('b', 'm'))
+        self.assertFalse('e' in tree.idom)
+        tree.rename('m', 'n')
+        self.assertTrue(tree.dominates('a', 'n'))
+
+
+class StronglyConnectedTest(unittest.TestCase):
+    def test_order(self):
+        graph = successors('a-b b-a b-c c-d d-c d-e')
+        components = [sorted(component) for component in find_strongly_connected(sorted(graph), graph.__getitem__)]
+        self.assertEqual(components, [['e'], ['c', 'd'], ['a', 'b']])
+
+
+class EdgeDominatorsTest(unittest.TestCase):
+    def test_diamonds(self):
+        nodes = make_graph(DIAMONDS)
+        edge = lambda first, last: (nodes[first], nodes[last])
+        dominators = EdgeDominators(nodes['a'], set())
+        self.assertEqual(dominators.get_post_dominators(edge('a', 'b')), [edge('b', 'd')])
+        self.assertTrue(dominators.pre_dominates(edge('a', 'b'), edge('b', 'd')))
+        self.assertFalse(dominators.pre_dominates(edge('a', 'b'), edge('d', 'e')))
+        self.assertEqual(dominators.get_both_dominator(edge('a', 'b')), edge('b', 'd'))
+        self.assertEqual(dominators.get_both_dominator(edge('d', 'e')), edge('e', 'g'))
+
+    def test_chain(self):
+        """The farthest dominator is many lifts away."""
+        count = 100
+        nodes = make_graph(' '.join('{0}-{1}'.format(i, i + 1) for i in range(count)))
+        dominators = EdgeDominators(nodes['0'], set())
+        for i in (0, 1, 37, count - 1):
+            self.assertEqual(dominators.get_both_dominator((nodes[str(i)], nodes[str(i + 1)])), (nodes[str(count - 1)], nodes[str(count)]))
+
+    def test_chain_with_bypass(self):
+        # 20 jumps over to 60, so edges in between don't dominate edges after 60
+        count = 100
+        nodes = make_graph(' '.join('{0}-{1}'.format(i, i + 1) for i in range(count)) + ' 20-x x-60')
+        dominators = EdgeDominators(nodes['0'], set())
+        edge = lambda first, last: (nodes[first], nodes[last])
+        self.assertEqual(dominators.get_both_dominator(edge('0', '1')), edge('99', '100'))
+        self.assertEqual(dominators.get_both_dominator(edge('20', '21')), edge('59', '60'))
+        self.assertEqual(dominators.get_both_dominator(edge('30', '31')), edge('59', '60'))
+        self.assertEqual(dominators.get_both_dominator(edge('20', 'x')), edge('x', '60'))
+        self.assertEqual(dominators.get_both_dominator(edge('60', '61')), edge('99', '100'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+import fuc
+import parsers.envydis
+import parsers.index
+from test_emulator import PROGRAM, parse, describe
+
+
+def as_envydis(program):
+    """envydis separates the opcode from the instruction with two spaces."""
+    return program.replace(': 00 ', ': 00  ')
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'program.asm')
+        self.write('// a comment\n' + as_envydis(PROGRAM))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, text):
+        with open(self.path, 'w') as deasm:
+            deasm.write(text)
+
+    def open(self):
+        return parsers.index.open_indexed(parsers.envydis, fuc, self.path)
+
+    def test_same_as_parsed(self):
+        instructions = self.open()
+        parsed = parse(PROGRAM)
+        self.assertEqual(len(instructions), len(parsed))
+        self.assertEqual([str(instruction) for instruction in instructions], [str(instruction) for instruction in parsed])
+        self.assertEqual(instructions.get_index(0x15), 7)
+        self.assertFalse(instructions.has_address(0x16))
+        self.assertRaises(KeyError, instructions.get_index, 0x16)
+
+    def test_parsed_when_reached(self):
+        instructions = self.open()
+        self.assertEqual(describe(fuc.detect_flow(instructions, 0x15)), describe(fuc.detect_flow(parse(PROGRAM), 0x15)))
+        self.assertEqual(sorted(instructions.instances), [7, 8])
+
+    def test_index_reused(self):
+        self.open()
+        self.assertTrue(os.path.exists(parsers.index.get_index_path(self.path)))
+        self.assertNotEqual(parsers.index.load_index(parsers.envydis, self.path), None)
+
+    def test_changed_file(self):
+        self.open()
+        self.write(as_envydis(PROGRAM) + '0000001b: 00  ret\n')
+        self.assertEqual(parsers.index.load_index(parsers.envydis, self.path), None)
+        self.assertEqual(len(self.open()), len(parse(PROGRAM)) + 1)
+
+    def test_unordered_addresses(self):
+        self.write('00000010: 00  ret\n00000000: 00  mov $r1 0x10\n00000003: 00  bra 0x10\n')
+        instructions = self.open()
+        self.assertEqual(instructions.get_index(0x10), 0)
+        self.assertEqual(instructions.get_index(3), 2)
+        self.assertEqual(describe(fuc.detect_flow(instructions, 0)), [('0-3', '10-10'), ('10-10', 'end'), ('start', '0-3')])
+
+
+if __name__ == '__main__':
+    unittest.main()
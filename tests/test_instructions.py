@@ -0,0 +1,105 @@
+import pickle
+import marshal
+import unittest
+import fuc
+import fuc.instructions
+import xtensa
+import xtensa.instructions
+import vp1
+import vp1.instructions
+import arches.x86_64
+import arches.x86_64.instructions
+from common.instructions import InstructionStore, classify
+
+
+# an instruction of every class: (address, opcode, mnemonic, operands)
+SAMPLES = {
+    fuc: [('00000000', (1,), 'ld', ['b32', '$r1', '[$r2+0x10]']),
+          ('00000003', (1,), 'st', ['b32', '[$r2+0x10]', '$r1']),
+          ('00000006', (1,), 'mov', ['$r1', '0x10']),
+          ('00000009', (1,), 'bra', ['ne', '0x3']),
+          ('0000000c', (1,), 'clear', ['b32', '$r1']),
+          ('0000000f', (1,), 'and', ['$r1', '$r2', '0xff']),
+          ('00000012', (1,), 'sethi', ['$r1', '0x10']),
+          ('00000015', (1,), 'call', ['0x3']),
+          ('00000018', (1,), 'ret', []),
+          ('0000001b', (1,), 'add', ['$r1', '$r2', '$r3'])],
+    xtensa: [('00000000', (1,), 'retw', []),
+             ('00000003', (1,), 'call', ['0x8', '0x20']),
+             ('00000006', (1,), 'beqz', ['$a2', '0x10']),
+             ('00000009', (1,), 'bne', ['$a2', '$a3', '0x10']),
+             ('0000000c', (1,), 'j', ['0x10']),
+             ('0000000f', (1,), 'jx', ['$a2']),
+             ('00000012', (1,), 's32i', ['$a2', '[$a1+0x4]']),
+             ('00000015', (1,), 'movi', ['$a2', '0x10']),
+             ('00000018', (1,), 'l32r', ['$a2', '$a3', '0x10']),
+             ('0000001b', (1,), 'add', ['$a2', '$a3', '$a4'])],
+    vp1: [('00000000', (0xe0,), 'bra', ['$c0', '0x10']),
+          ('00000001', (0xe0,), 'ret', []),
+          ('00000002', (0xe0,), 'exit', []),
+          ('00000003', (0xe0,), 'call', ['0x10']),
+          ('00000004', (0x80,), 'vadd', ['$v1', '$v2'])],
+    arches.x86_64: [('0', (1,), 'retq', []),
+                    ('1', (1,), 'call', ['10']),
+                    ('2', (1,), 'jmp', ['10']),
+                    ('3', (1,), 'jne', ['10']),
+                    ('4', (1,), 'repz', ['retq']),
+                    ('6', (1,), 'mov', ['%rax', '%rbx'])],
+}
+
+
+def describe(instruction):
+    return (instruction.__class__, instruction.addr, tuple(instruction.opcode), instruction.mnemonic, list(instruction.operands),
+            classify(instruction), str(instruction))
+
+
+class RoundTripTest(unittest.TestCase):
+    def check(self, arch, rebuild):
+        """rebuild: InstructionStore -> InstructionStore holding the same instructions."""
+        originals = [arch.Instruction(*sample) for sample in SAMPLES[arch]]
+        store = InstructionStore(arch.Instruction)
+        for instruction in originals:
+            store.append(instruction)
+        store = rebuild(store)
+        self.assertEqual([describe(instruction) for instruction in store], [describe(instruction) for instruction in originals])
+
+    def test_every_class_sampled(self):
+        for arch in SAMPLES:
+            classes = set(arch.instructions.instruction_map.values()) | set([arch.instructions.SimpleInstruction])
+            self.assertEqual(set(arch.Instruction(*sample).__class__ for sample in SAMPLES[arch]), classes)
+
+    def test_store(self):
+        for arch in SAMPLES:
+            self.check(arch, lambda store: store)
+
+    def test_columns(self):
+        """The way cache entries are written and read."""
+        for arch in SAMPLES:
+            self.check(arch, lambda store: InstructionStore(arch.Instruction, marshal.loads(marshal.dumps(store.get_columns()))))
+
+    def test_prefixed_return(self):
+        store = InstructionStore(arches.x86_64.Instruction)
+        store.append(arches.x86_64.Instruction('0', (0xf3, 0xc3), 'repz', ['retq']))
+        rebuilt = InstructionStore(arches.x86_64.Instruction, store.get_columns())[0]
+        self.assertTrue(isinstance(rebuilt, arches.x86_64.instructions.Repeater))
+        self.assertTrue(rebuilt.breaks_function())
+
+
+class RegistersTest(unittest.TestCase):
+    def test_found_once(self):
+        instruction = fuc.Instruction('00000000', (1,), 'and', ['$r1', '$r2', '0xff'])
+        self.assertEqual(instruction.get_read_regs(), frozenset(['$r2']))
+        self.assertEqual(instruction.get_modified_regs(), frozenset(['$r1']))
+        self.assertTrue(instruction.find_regs() is instruction.find_regs())
+
+    def test_unsupported(self):
+        for instruction in (fuc.Instruction('00000000', (1,), 'add', ['$r1', '$r2', '$r3']),
+                            vp1.Instruction('00000000', (0x80,), 'vadd', ['$v1', '$v2'])): # no machine model
+            for i in range(2):
+                self.assertRaises(NotImplementedError, instruction.get_modified_regs)
+            # functions holding it still go back from worker processes
+            self.assertRaises(NotImplementedError, pickle.loads(pickle.dumps(instruction, pickle.HIGHEST_PROTOCOL)).get_read_regs)
+
+
+if __name__ == '__main__':
+    unittest.main()
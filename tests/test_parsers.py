@@ -0,0 +1,83 @@
+import unittest
+import fuc
+import arches.x86_64
+import parsers
+import parsers.envydis
+from parsers.common import FunctionHeader
+
+
+def describe(instruction):
+    return instruction.address, tuple(instruction.opcode), instruction.mnemonic, list(instruction.operands)
+
+
+class EnvydisTest(unittest.TestCase):
+    def parse(self, line):
+        return describe(parsers.envydis.parse_deasm_line(fuc, line))
+
+    def test_line(self):
+        self.assertEqual(self.parse('0000001e: f10f2100  mov $r4 $r5'), (0x1e, (0xf1, 0x0f, 0x21, 0x00), 'mov', ['$r4', '$r5']))
+
+    def test_flags_dropped(self):
+        self.assertEqual(self.parse('00000003: 0e01  NZ bra ne 0x12'), (3, (0x0e, 0x01), 'bra', ['ne', '0x12']))
+
+    def test_odd_opcode(self):
+        self.assertEqual(self.parse('00000003: e01  ret'), (3, (0x0e, 0x01), 'ret', []))
+
+    def test_not_instructions(self):
+        for line in ('', '// comment', '[00000000]'):
+            self.assertEqual(parsers.envydis.parse_deasm_line(fuc, line), None)
+
+    def test_deasm(self):
+        lines = iter(['// comment\n', '[00000000]\n', '00000000: 0e01  mov $r1 0x10\n', '\n', '00000002: f8  ret\n'])
+        instructions, function_mapping = parsers.envydis.parse_deasm(fuc, lines)
+        self.assertEqual([describe(instruction) for instruction in instructions], [(0, (0x0e, 0x01), 'mov', ['$r1', '0x10']), (2, (0xf8,), 'ret', [])])
+        self.assertEqual(instructions.get_index(2), 1)
+        self.assertEqual(function_mapping, {})
+
+
+class ObjdumpTest(unittest.TestCase):
+    LINES = ['\n',
+             'Disassembly of section .text:\n',
+             '00000000004004d6 <main>:\n',
+             '  4004d6:\t48 89 e5             \tmov    rbp,rsp\n',
+             '  4004d9:\tc3                   \tretq   \n',
+             '00000000004004da <f>:\n',
+             '  4004da:\tc3                   \tretq   \n']
+
+    def parse(self, line):
+        return parsers.objdump.parse_deasm_line(arches.x86_64, line)
+
+    def test_line(self):
+        instruction = self.parse('  4004d6:\t48 89 e5             \tmov    rbp,rsp')
+        self.assertEqual(describe(instruction), (0x4004d6, (0x48, 0x89, 0xe5), 'mov', ['rbp', 'rsp']))
+
+    def test_same_as_unusual(self):
+        """Lines matched in one go give what splitting them does."""
+        for line in ('  4004d6:\t48 89 e5             \tmov    rbp,rsp',
+                     '  4004d9:\t75 0a                \tjne    4004e5 <f+0x10>',
+                     '  4004db:\tc3                   \tretq   ',
+                     '  4004dc:\tf3 c3                \trepz retq ',
+                     '  4004de:\t00 00 00 00'):
+            self.assertEqual(describe(self.parse(line)), describe(parsers.objdump.parse_unusual_instruction(arches.x86_64, line.strip())), line)
+
+    def test_header(self):
+        header = self.parse('00000000004004d6 <main>:')
+        self.assertTrue(isinstance(header, FunctionHeader))
+        self.assertEqual((header.address, header.name), (0x4004d6, 'main'))
+
+    def test_not_instructions(self):
+        for line in ('', '\n', 'Disassembly of section .text:'):
+            self.assertEqual(self.parse(line), None)
+
+    def test_deasm(self):
+        instructions, function_mapping = parsers.objdump.parse_deasm(arches.x86_64, iter(self.LINES))
+        self.assertEqual([describe(instruction) for instruction in instructions],
+                         [(0x4004d6, (0x48, 0x89, 0xe5), 'mov', ['rbp', 'rsp']), (0x4004d9, (0xc3,), 'retq', []), (0x4004da, (0xc3,), 'retq', [])])
+        self.assertEqual(function_mapping, {0x4004d6: 'main', 0x4004da: 'f'})
+
+    def test_duplicate_header(self):
+        self.assertRaises(ValueError, parsers.objdump.parse_deasm, arches.x86_64, iter(self.LINES[2:4] + self.LINES[2:4]))
+
+
+if __name__ == '__main__':
+    unittest.main()
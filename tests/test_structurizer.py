@@ -0,0 +1,57 @@
+import unittest
+import fuc
+import flow
+from common.graphs import iternodes
+from flow.structurizer import find_reverse_edges
+from test_emulator import parse
+
+
+def name(node):
+    if hasattr(node, 'instructions'):
+        return node.instructions.instructions[0].address
+    return str(node)
+
+
+class ReverseEdgesTest(unittest.TestCase):
+    def find(self, program):
+        head = fuc.detect_flow(parse(program), 0)
+        tail, = [node for node in iternodes(head) if isinstance(node, flow.emulator.EndNode)]
+        return sorted((name(a), name(b)) for a, b in find_reverse_edges(head, tail))
+
+    def test_loop(self):
+        self.assertEqual(self.find('00000000: 00 mov $r1 0x1\n00000003: 00 bra ne 0x0\n00000006: 00 ret'), [(0, 0)])
+
+    def test_edge_into_reversed_node(self):
+        # 3 only leads back, so the edge reaching it goes backwards too
+        self.assertEqual(self.find('00000000: 00 bra ne 0x6\n00000003: 00 bra 0x0\n00000006: 00 ret'), [(0, 3), (3, 0)])
+
+    def test_no_loops(self):
+        self.assertEqual(self.find('00000000: 00 bra ne 0x6\n00000003: 00 mov $r1 0x1\n00000006: 00 ret'), [])
+
+
+class ManyBranchesTest(unittest.TestCase):
+    def test_sequential_ifs(self):
+        """Paths double with every if, dominators don't."""
+        count = 30
+        lines = []
+        for i in range(count):
+            lines.append('{0:08x}: 00 bra ne 0x{1:x}'.format(i * 6, i * 6 + 6))
+            lines.append('{0:08x}: 00 mov $r1 0x{1:x}'.format(i * 6 + 3, i))
+        lines.append('{0:08x}: 00 ret'.format(count * 6))
+        function = flow.detect_function(fuc, parse('\n'.join(lines)), 0)
+        self.assertEqual(function.address, 0)
+
+
+class EndlessLoopTest(unittest.TestCase):
+    def detect(self, program):
+        return flow.detect_function(fuc, parse(program), 0)
+
+    def test_head_only_leads_back(self):
+        self.assertRaises(flow.FlowDetectionError, self.detect, '00000000: 00 mov $r1 0x1\n00000003: 00 bra 0x0\n00000006: 00 bra ne 0x3')
+
+    def test_loops_before_end(self):
+        self.assertRaises(flow.FlowDetectionError, self.detect, '00000000: 00 bra ne 0x9\n00000003: 00 bra ne 0x3\n00000006: 00 bra ne 0x6\n00000009: 00 ret')
+
+
+if __name__ == '__main__':
+    unittest.main()
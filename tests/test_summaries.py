@@ -0,0 +1,104 @@
+import shutil
+import tempfile
+import unittest
+import fuc
+import vp1
+import flow
+import values
+import operations
+from flow.calls import find_calls
+from flow.dataflow import ReachingDefinitions
+from flow.summaries import summarize_functions, UntrackedMemory
+from test_emulator import VP1_PROGRAM, parse
+from test_dataflow import find_position
+
+
+PROGRAM = '''\
+00000000: 00 mov $r2 0x100
+00000003: 00 call 0x12
+00000006: 00 mov $r1 $r10
+00000009: 00 call 0x12
+0000000c: 00 ret
+00000012: 00 ld b32 $r3 [$r2+0x4]
+00000015: 00 st b32 [$r1+0x8] $r3
+00000018: 00 ret
+00000020: 00 call 0x20
+00000023: 00 ret
+'''
+
+
+def find_flat_graphs(arch, instructions, address):
+    """Returns address -> flat flow graph of the function at address and all functions it calls."""
+    flat_graphs = {}
+    addresses = [address]
+    while addresses:
+        address = addresses.pop()
+        if address not in flat_graphs:
+            flat_graphs[address] = flow.detect_flat_flow(arch, instructions, address)
+            addresses.extend(find_calls(flat_graphs[address]))
+    return flat_graphs
+
+
+class SummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.flat_graphs = find_flat_graphs(fuc, parse(PROGRAM), 0)
+        self.flat_graphs.update(find_flat_graphs(fuc, parse(PROGRAM), 0x20))
+        self.summaries = summarize_functions(self.flat_graphs, 'fuc')
+
+    def test_leaf(self):
+        summary = self.summaries[0x12]
+        self.assertEqual(summary.read, frozenset(['$r1', '$r2']))
+        self.assertEqual(summary.written, frozenset(['$r3']))
+        self.assertEqual(summary.loads, frozenset([('$r2', 4, 4)]))
+        self.assertEqual(summary.stores, frozenset([('$r1', 8, 4)]))
+        self.assertTrue(summary.returns)
+
+    def test_caller(self):
+        summary = self.summaries[0]
+        # $r2 is set before the calls, $r1 only before the second one
+        self.assertEqual(summary.read, frozenset(['$r1', '$r10']))
+        self.assertEqual(summary.written, frozenset(['$r1', '$r2', '$r3']))
+        self.assertEqual(summary.loads, frozenset([(None, 0x104, 4)]))
+        # the second call stores through $r10, which is not a location known at the entry
+        self.assertEqual(summary.stores, None)
+
+    def test_recursion(self):
+        summary = self.summaries[0x20]
+        self.assertEqual(summary.written, None)
+        self.assertEqual(summary.stores, None)
+
+    def test_call_results(self):
+        head = self.flat_graphs[0]
+        definitions = ReachingDefinitions(head, self.summaries)
+        register_values = operations.RegisterValues(definitions, UntrackedMemory(), self.summaries)
+        get = lambda address, register: register_values.get(*(find_position(head, address) + (register,)))
+        # the called function doesn't write $r2
+        self.assertEqual(get(6, '$r2'), 0x100)
+        self.assertTrue(get(6, '$r3') is values.get_call_result('$r3', 0x12, 3))
+        # the second call may leave something else
+        self.assertTrue(get(0xc, '$r3') is values.get_call_result('$r3', 0x12, 9))
+        self.assertTrue(get(0xc, '$r1') is values.get_unknown('$r10'))
+
+    def test_cached(self):
+        directory = tempfile.mkdtemp()
+        try:
+            first = summarize_functions(self.flat_graphs, 'fuc', directory)
+            second = summarize_functions(self.flat_graphs, 'fuc', directory)
+        finally:
+            shutil.rmtree(directory)
+        for address, summary in self.summaries.items():
+            self.assertEqual(str(first[address]), str(summary))
+            self.assertEqual(str(second[address]), str(summary))
+
+
+class NoMachineModelTest(unittest.TestCase):
+    """vp1 instructions can't be evaluated."""
+    def test_summary_unknown(self):
+        instructions = parse(VP1_PROGRAM, vp1)
+        self.assertRaises(NotImplementedError, instructions[0].find_regs)
+        summary = summarize_functions({0: vp1.detect_flow(instructions, 0)}, 'vp1')[0]
+        self.assertEqual((summary.read, summary.written, summary.loads, summary.stores), (None, None, None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
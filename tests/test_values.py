@@ -0,0 +1,68 @@
+import unittest
+import values
+from values import get_unknown, get_and, get_or, get_memory_read, get_call_result
+
+
+class HashConsingTest(unittest.TestCase):
+    def test_same_expression_same_value(self):
+        x = get_unknown('$r1')
+        self.assertTrue(x is get_unknown('$r1'))
+        self.assertTrue(get_and(x, get_unknown('$r2')) is get_and(x, get_unknown('$r2')))
+        self.assertTrue(get_memory_read(x, 4, 4) is get_memory_read(x, 4, 4))
+        self.assertTrue(get_call_result('$r1', 0x10, 4) is get_call_result('$r1', 0x10, 4))
+        self.assertFalse(get_call_result('$r1', 0x10, 4) is get_call_result('$r1', 0x10, 8))
+        self.assertFalse(get_memory_read(x, 4, 4) is get_memory_read(x, 4, 2))
+
+    def test_operators(self):
+        x = get_unknown('$r1')
+        self.assertTrue((x & 0xff) is get_and(x, 0xff))
+        self.assertTrue((0xff & x) is get_and(x, 0xff))
+        self.assertTrue((x | 1) is get_or(1, x))
+
+
+class FoldingTest(unittest.TestCase):
+    def setUp(self):
+        self.x = get_unknown('$r1')
+
+    def test_constants(self):
+        self.assertEqual(get_and(0xf0, 0x3c), 0x30)
+        self.assertEqual(get_or(0xf0, 0x0f), 0xff)
+
+    def test_identities(self):
+        x = self.x
+        self.assertEqual(get_and(x, 0), 0)
+        self.assertTrue(get_or(x, 0) is x)
+
+    def test_same_value_not_folded(self):
+        """The same object may stand for different values at runtime, e.g. memory read before and after a store."""
+        x = self.x
+        self.assertTrue(isinstance(get_and(x, x), values.BitwiseAndResult))
+        self.assertTrue(isinstance(get_or(x, x), values.BitwiseOrResult))
+
+    def test_constant_on_the_right(self):
+        value = get_and(0xff, self.x)
+        self.assertTrue(value.v1 is self.x)
+        self.assertEqual(value.v2, 0xff)
+
+    def test_nested_masks(self):
+        x = self.x
+        self.assertTrue(get_and(get_and(x, 0xff0), 0x0ff) is get_and(x, 0xf0))
+        self.assertTrue(get_or(get_or(x, 0x10), 0x01) is get_or(x, 0x11))
+
+    def test_masked_or(self):
+        x = self.x
+        # the or only sets bits the mask clears
+        self.assertTrue(get_and(get_or(x, 0x10000), 0xffff) is get_and(x, 0xffff))
+        # the or sets all bits the mask keeps
+        self.assertEqual(get_and(get_or(x, 0xff), 0x0f), 0x0f)
+        # the or sets some of them
+        self.assertTrue(isinstance(get_and(get_or(x, 0x11), 0x0f), values.BitwiseAndResult))
+
+    def test_str(self):
+        x = self.x
+        self.assertEqual(str(get_or(get_and(x, 0xffff), 0x10000)), '($r1 & 0xffff) | 0x10000')
+        self.assertEqual(str(get_call_result('$r3', 0x12, 4)), '$r3@f_0x12')
+
+
+if __name__ == '__main__':
+    unittest.main()
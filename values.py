@@ -1,3 +1,14 @@
+"""Symbolic values of registers and memory.
+
+Values are hash-consed: get_unknown, get_memory_read, get_call_result, get_and and get_or return the existing value for the same expression, so equal expressions are the same object and compare by identity. Constants are plain ints or longs, folded as soon as an expression is built, together with a few simplifications for masking.
+"""
+
+import weakref
+
+
+CONSTANTS = (int, long)
+
+
 def armored(value):
     if not value.will_collapse():
         return '({0})'.format(value)
@@ -6,8 +17,8 @@ def armored(value):
 
 
 def print_prepared(value):
-    if isinstance(v1alue, int):
-        value = hex(value)
+    if isinstance(value, CONSTANTS):
+        value = '0x{0:x}'.format(value)
     else:
         value = armored(value)
     return value
@@ -15,10 +26,16 @@ def print_prepared(value):
 
 class Value:
     def __and__(self, other):
-        return BitwiseAndResult(self, other)
+        return get_and(self, other)
+
+    def __rand__(self, other):
+        return get_and(other, self)
 
     def __or__(self, other):
-        return BitwiseOrResult(self, other)
+        return get_or(self, other)
+
+    def __ror__(self, other):
+        return get_or(other, self)
 
     def will_collapse(self):
         raise NotImplementedError
@@ -35,6 +52,16 @@ class UnknownValue(Value):
         return True
 
 
+unknown_values = {}
+
+def get_unknown(name):
+    """Returns the UnknownValue called name. There's only one per name, so states can share them."""
+    value = unknown_values.get(name)
+    if value is None:
+        value = unknown_values[name] = UnknownValue(name)
+    return value
+
+
 class MemoryRead(Value):
     def __init__(self, base, offset, size):
         self.base = base
@@ -48,27 +75,31 @@ class MemoryRead(Value):
         return '({2})D[{0}+{1}]'.format(self.base, self.offset, 'b' + str(self.size * 8))
 
 
-class BitwiseAndResult(Value):
-    def __init__(self, value1, value2):
-        self.v1, self.v2 = value1, value2
+class CallResult(Value):
+    """What a register holds after the call at call_site to the function at address, which may write it.
+    Each call site gets its own: two calls to the same function may leave different values.
+    """
+    def __init__(self, register, address, call_site):
+        self.register = register
+        self.address = address
+        self.call_site = call_site
 
     def will_collapse(self):
-        return isinstance(self.v1, int) and isinstance(self.v2, int)
-    
+        return True
+
     def __str__(self):
-        v1 = self.v1
-        v2 = self.v2
-        if isinstance(v1, int) and isinstance(v2, int):
-            return str(v1 & v2)
-        else:
+        return '{0}@f_0x{1:x}'.format(self.register, self.address)
 
 
-            if isinstance(v2, int):
-                v2 = hex(v2)
-            else:
-                v2 = armored(v2)
+class BitwiseAndResult(Value):
+    def __init__(self, value1, value2):
+        self.v1, self.v2 = value1, value2
+
+    def will_collapse(self):
+        return False
 
-            return '{0} & {1}'.format(v1, v2)
+    def __str__(self):
+        return '{0} & {1}'.format(print_prepared(self.v1), print_prepared(self.v2))
 
 
 class BitwiseOrResult(Value):
@@ -76,15 +107,63 @@ class BitwiseOrResult(Value):
         self.v1, self.v2 = value1, value2
 
     def will_collapse(self):
-        return isinstance(self.v1, int) and isinstance(self.v2, int)
-    
+        return False
+
     def __str__(self):
-        v1 = self.v1
-        v2 = self.v2
-        if isinstance(v1, int) and isinstance(v2, int):
-            return str(v1 | v2)
-        else:
-            v1 = print_prepared(v1)
-            v2 = print_prepared(v2)
-
-            return '{0} | {1}'.format(v1, v2)
\ No newline at end of file
+        return '{0} | {1}'.format(print_prepared(self.v1), print_prepared(self.v2))
+
+
+# expression -> value, forgotten once nothing uses the value
+expressions = weakref.WeakValueDictionary()
+
+def get_expression(cls, *args):
+    key = (cls,) + args
+    value = expressions.get(key)
+    if value is None:
+        value = expressions[key] = cls(*args)
+    return value
+
+
+def get_memory_read(base, offset, size):
+    return get_expression(MemoryRead, base, offset, size)
+
+
+def get_call_result(register, address, call_site):
+    return get_expression(CallResult, register, address, call_site)
+
+
+def get_and(value1, value2):
+    """Returns value1 & value2, folded. Constants end up on the right."""
+    if isinstance(value1, CONSTANTS):
+        if isinstance(value2, CONSTANTS):
+            return value1 & value2
+        value1, value2 = value2, value1
+    if isinstance(value2, CONSTANTS):
+        if value2 == 0:
+            return 0
+        if isinstance(value1, BitwiseAndResult) and isinstance(value1.v2, CONSTANTS):
+            # (x & m1) & m2 == x & (m1 & m2)
+            return get_and(value1.v1, value1.v2 & value2)
+        if isinstance(value1, BitwiseOrResult) and isinstance(value1.v2, CONSTANTS):
+            if value1.v2 & value2 == 0:
+                # bits set by the or are masked out
+                return get_and(value1.v1, value2)
+            if value1.v2 & value2 == value2:
+                # all bits kept by the mask are set
+                return value2
+    return get_expression(BitwiseAndResult, value1, value2)
+
+
+def get_or(value1, value2):
+    """Returns value1 | value2, folded. Constants end up on the right."""
+    if isinstance(value1, CONSTANTS):
+        if isinstance(value2, CONSTANTS):
+            return value1 | value2
+        value1, value2 = value2, value1
+    if isinstance(value2, CONSTANTS):
+        if value2 == 0:
+            return value1
+        if isinstance(value1, BitwiseOrResult) and isinstance(value1.v2, CONSTANTS):
+            # (x | c1) | c2 == x | (c1 | c2)
+            return get_or(value1.v1, value1.v2 | value2)
+    return get_expression(BitwiseOrResult, value1, value2)
@@ -11,5 +11,10 @@ def find_function_addresses(instructions):
     
     
 def detect_flow(instructions, start_address):
-    flow_emulator = vp1_flow.Emulator(instructions, start_address)
+    flow_emulator = vp1_flow.WorklistEmulator(instructions, start_address)
     return flow_emulator.flow
+
+
+def find_blocks(instructions):
+    """Branch delays make block boundaries depend on emulation state. Flow is detected separately for each function."""
+    return None
@@ -35,13 +35,12 @@ class Emulator(FunctionFlowEmulator):
                     return True
             return False
 
-        current_index = index
-        
         machine_jump_target = None
         machine_jump_reason = None
         machine_jump_fresh = False
         
-        for instruction in self.instructions[current_index:]:
+        for current_index in xrange(index, len(self.instructions)):
+            instruction = self.instructions[current_index]
             machine_jump_fresh = False
             jump_target = instruction.get_branch_target()
             if jump_target is not None:
@@ -91,4 +90,6 @@ class Emulator(FunctionFlowEmulator):
                 return
     #        print 'crashes not'
 
-            current_index += 1
+
+class WorklistEmulator(WorklistEmulatorMixIn, Emulator):
+    pass